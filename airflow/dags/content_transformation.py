@@ -511,11 +511,11 @@ def save_markdown_result(**context):
     transformation_results = context['task_instance'].xcom_pull(task_ids='transform_content_blocks')
     
     original_config = transformation_session['original_config']
-    timestamp = original_config.get('timestamp', int(datetime.now().timestamp()))
+    file_id = original_config.get('file_id', original_config.get('timestamp', int(datetime.now().timestamp())))
     filename = original_config.get('filename', 'unknown.pdf')
     
     # Сохранение в папку для китайского языка (исходный Markdown)
-    output_path = SharedUtils.prepare_output_path(filename, 'zh', timestamp)
+    output_path = SharedUtils.prepare_output_path(filename, 'zh', file_id)
     
     # Сохранение Markdown файла
     SharedUtils.save_final_result(
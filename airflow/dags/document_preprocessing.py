@@ -184,11 +184,12 @@ analyze_results = PythonOperator(
 def save_intermediate_results(**context):
     """Сохранение промежуточных результатов"""
     dag_2_input = context['task_instance'].xcom_pull(task_ids='analyze_extraction_results')
-    timestamp = context['dag_run'].conf.get('timestamp', int(datetime.now().timestamp()))
-    filename = context['dag_run'].conf.get('filename', 'unknown.pdf')
+    dag_conf = context['dag_run'].conf
+    file_id = dag_conf.get('file_id', dag_conf.get('timestamp', int(datetime.now().timestamp())))
+    filename = dag_conf.get('filename', 'unknown.pdf')
     
     # Сохранение данных для следующего DAG
-    intermediate_path = f"/app/temp/dag1_results_{timestamp}.json"
+    intermediate_path = f"/app/temp/dag1_results_{file_id}.json"
     
     import json
     import os
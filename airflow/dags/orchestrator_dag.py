@@ -69,6 +69,8 @@ def validate_orchestrator_input(**context):
         'enable_ocr': dag_run_conf.get('enable_ocr', True),
         'preserve_structure': dag_run_conf.get('preserve_structure', True),
         'timestamp': dag_run_conf['timestamp'],
+        # Уникальный ID файла для путей результатов (старые запуски передавали только timestamp)
+        'file_id': dag_run_conf.get('file_id', dag_run_conf['timestamp']),
         'batch_id': dag_run_conf.get('batch_id'),
         'batch_mode': dag_run_conf.get('batch_mode', False),
         'master_run_id': context['dag_run'].run_id,
@@ -91,6 +93,7 @@ def trigger_dag1_preprocessing(**context):
         'preserve_structure': master_config['preserve_structure'],
         'quality_level': master_config['quality_level'],
         'timestamp': master_config['timestamp'],
+        'file_id': master_config['file_id'],
         'master_run_id': master_config['master_run_id'],
         'ocr_languages': 'chi_sim,chi_tra,eng,rus',
         'extract_tables': True,
@@ -107,7 +110,7 @@ def prepare_dag2_config(**context):
     
     # DAG 2 получит промежуточные результаты от DAG 1
     dag2_config = {
-        'intermediate_file': f"/app/temp/dag1_results_{master_config['timestamp']}.json",
+        'intermediate_file': f"/app/temp/dag1_results_{master_config['file_id']}.json",
         'original_config': master_config,
         'dag1_completed': True,
         # ✅ ИСПРАВЛЕНО: Правильная модель для Content Transformation
@@ -125,7 +128,7 @@ def prepare_dag3_config(**context):
     
     # DAG 3 получит Markdown файл от DAG 2
     dag3_config = {
-        'markdown_file': f"/app/output/{master_config['target_language']}/{master_config['timestamp']}_{master_config['filename'].replace('.pdf', '.md')}",
+        'markdown_file': f"/app/output/{master_config['target_language']}/{master_config['file_id']}_{master_config['filename'].replace('.pdf', '.md')}",
         'original_config': master_config,
         'dag2_completed': True,
         # ✅ ИСПРАВЛЕНО: Правильная модель для Translation Pipeline
@@ -143,7 +146,7 @@ def prepare_dag4_config(**context):
     
     # DAG 4 получит переведенный контент от DAG 3
     dag4_config = {
-        'translated_file': f"/app/output/{master_config['target_language']}/{master_config['timestamp']}_{master_config['filename'].replace('.pdf', '.md')}",
+        'translated_file': f"/app/output/{master_config['target_language']}/{master_config['file_id']}_{master_config['filename'].replace('.pdf', '.md')}",
         'original_config': master_config,
         'translation_metadata': {
             'target_language': master_config['target_language'],
@@ -204,8 +207,8 @@ def finalize_orchestration(**context):
         'processing_duration_seconds': processing_duration.total_seconds(),
         'source_file': master_config['input_file'],
         'target_language': master_config['target_language'],
-        'final_output_path': f"/app/output/{master_config['target_language']}/{master_config['timestamp']}_{master_config['filename'].replace('.pdf', '.md')}",
-        'qa_report_path': f"/app/temp/qa_report_qa_{master_config['timestamp']}.json",
+        'final_output_path': f"/app/output/{master_config['target_language']}/{master_config['file_id']}_{master_config['filename'].replace('.pdf', '.md')}",
+        'qa_report_path': f"/app/temp/qa_report_qa_{master_config['file_id']}.json",
         'pipeline_stages_completed': 4,
         'modular_architecture': True,
         'models_used': pipeline_status.get('models_used', {}),
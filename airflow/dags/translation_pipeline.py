@@ -570,11 +570,11 @@ def save_translation_result(**context):
     
     original_config = translation_session['original_config']
     target_language = translation_session['target_language']
-    timestamp = original_config.get('timestamp', int(datetime.now().timestamp()))
+    file_id = original_config.get('file_id', original_config.get('timestamp', int(datetime.now().timestamp())))
     filename = original_config.get('filename', 'unknown.pdf')
     
     # Определение пути сохранения
-    output_path = SharedUtils.prepare_output_path(filename, target_language, timestamp)
+    output_path = SharedUtils.prepare_output_path(filename, target_language, file_id)
     
     # Сохранение переведенного контента
     SharedUtils.save_final_result(
@@ -2,12 +2,18 @@
 from flask import Flask, request, jsonify, send_file
 from werkzeug.utils import secure_filename
 import requests
+from requests.adapters import HTTPAdapter
 import os
 import json
+import math
 import time
+import uuid
+import random
 from datetime import datetime
 import logging
 from pathlib import Path
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
@@ -19,30 +25,59 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Исправленная конфигурация сервисов для v2.0
-SERVICES = {
-    'airflow': os.getenv('AIRFLOW_BASE_URL', 'http://airflow-webserver:8080'),
-    'document_processor': os.getenv('DOCUMENT_PROCESSOR_URL', 'http://document-processor:8001'),
-    'vllm': os.getenv('VLLM_BASE_URL', 'http://vllm-server:8000'),
-    'quality_assurance': os.getenv('QUALITY_ASSURANCE_URL', 'http://quality-assurance:8002'),
-    'translator': os.getenv('TRANSLATOR_URL', 'http://translator:8003')
-}
+SERVICES = SimpleNamespace(
+    airflow=os.getenv('AIRFLOW_BASE_URL', 'http://airflow-webserver:8080'),
+    document_processor=os.getenv('DOCUMENT_PROCESSOR_URL', 'http://document-processor:8001'),
+    vllm=os.getenv('VLLM_BASE_URL', 'http://vllm-server:8000'),
+    quality_assurance=os.getenv('QUALITY_ASSURANCE_URL', 'http://quality-assurance:8002'),
+    translator=os.getenv('TRANSLATOR_URL', 'http://translator:8003')
+)
+# Пары (имя, URL) для обхода всех сервисов в /health и статистике
+SERVICE_ITEMS = tuple(vars(SERVICES).items())
 
-ALLOWED_EXTENSIONS = {'pdf'}
+# Общая HTTP-сессия для Airflow API: пул соединений и заголовки задаются один раз
+AIRFLOW = requests.Session()
+AIRFLOW.headers.update({'Authorization': 'Basic YWRtaW46YWRtaW4='})  # admin:admin в base64
+AIRFLOW.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
+DAG_RUNS_URL = SERVICES.airflow + '/api/v1/dags/orchestrator_dag/dagRuns'
+DAG_RUN_URL = DAG_RUNS_URL + '/{}'
+TASK_INSTANCES_URL = DAG_RUN_URL + '/taskInstances'
+
+ALLOWED_SUFFIXES = ('.pdf',)
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(ALLOWED_SUFFIXES)
+
+def request_too_large():
+    """Проверка Content-Length до чтения тела запроса"""
+    content_length = request.content_length
+    return bool(content_length and content_length > app.config['MAX_CONTENT_LENGTH'])
+
+# Кэш ISO-времени с точностью до секунды: (секунда, строка)
+_ts_cache = (0, '')
+
+def fast_isoformat():
+    """Текущее время в ISO формате, форматируется не чаще раза в секунду"""
+    global _ts_cache
+    now = int(time.time())
+    cached_second, cached_iso = _ts_cache
+    if cached_second != now:
+        cached_iso = datetime.fromtimestamp(now).isoformat()
+        _ts_cache = (now, cached_iso)
+    return cached_iso
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Проверка состояния системы"""
     status = {
         'status': 'healthy', 
-        'timestamp': datetime.now().isoformat(),
+        'timestamp': fast_isoformat(),
         'version': 'v2.0',
         'services': {}
     }
     
-    for service_name, url in SERVICES.items():
+    for service_name, url in SERVICE_ITEMS:
         try:
             response = requests.get(f"{url}/health", timeout=5)
             status['services'][service_name] = {
@@ -73,6 +108,9 @@ def convert_pdf():
     Основной API для конвертации PDF в Markdown
     Поддерживает модульную архитектуру DAG v2.0
     """
+    if request_too_large():
+        return jsonify({'error': 'Файл слишком большой'}), 413
+    
     if 'file' not in request.files:
         return jsonify({'error': 'Файл не найден в запросе'}), 400
     
@@ -89,12 +127,10 @@ def convert_pdf():
     
     # Сохранение файла
     filename = secure_filename(file.filename)
-    timestamp = int(time.time())
-    unique_filename = f"{timestamp}_{filename}"
+    # Уникальный ID вместо секунд: два запроса в одну секунду не должны конфликтовать
+    file_id = uuid.uuid4().hex[:16]
+    unique_filename = f"{file_id}_{filename}"
     file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-    
-    # Создание директории если не существует
-    Path(app.config['UPLOAD_FOLDER']).mkdir(parents=True, exist_ok=True)
     file.save(file_path)
     
     # Конфигурация задачи для модульных DAG
@@ -106,40 +142,36 @@ def convert_pdf():
         'enable_ocr': enable_ocr,
         'preserve_structure': preserve_structure,
         'enable_qa': enable_qa,
-        'timestamp': timestamp,
+        'file_id': file_id,
+        'timestamp': int(time.time()),
         'processing_chain': get_processing_chain(target_language, enable_qa)
     }
     
     # Запуск orchestrator DAG через Airflow API
     try:
-        airflow_url = f"{SERVICES['airflow']}/api/v1/dags/orchestrator_dag/dagRuns"
-        dag_run_id = f"pdf_convert_{timestamp}"
+        dag_run_id = f"pdf_convert_{file_id}"
         
         logger.info(f"Запуск обработки файла {filename} с ID: {dag_run_id}")
         
-        response = requests.post(
-            airflow_url,
+        response = AIRFLOW.post(
+            DAG_RUNS_URL,
             json={
                 'conf': task_config,
                 'dag_run_id': dag_run_id
             },
-            headers={
-                'Content-Type': 'application/json',
-                'Authorization': 'Basic YWRtaW46YWRtaW4='  # admin:admin в base64
-            },
             timeout=30
         )
         
         if response.status_code in [200, 201]:
             dag_run_info = response.json()
             return jsonify({
-                'task_id': timestamp,
+                'task_id': file_id,
                 'status': 'started',
                 'dag_run_id': dag_run_id,
                 'filename': filename,
                 'target_language': target_language,
                 'estimated_time': get_estimated_time(quality_level, target_language),
-                'tracking_url': f"/api/v1/status/{timestamp}",
+                'tracking_url': f"/api/v1/status/{file_id}",
                 'config': task_config
             }), 202
         else:
@@ -188,22 +220,14 @@ def get_task_status(task_id):
         dag_run_id = f"pdf_convert_{task_id}"
         
         # Проверяем статус DAG run
-        response = requests.get(
-            f"{SERVICES['airflow']}/api/v1/dags/orchestrator_dag/dagRuns/{dag_run_id}",
-            headers={'Authorization': 'Basic YWRtaW46YWRtaW4='},
-            timeout=10
-        )
+        response = AIRFLOW.get(DAG_RUN_URL.format(dag_run_id), timeout=10)
         
         if response.status_code == 200:
             dag_info = response.json()
             state = dag_info.get('state', 'unknown')
             
             # Получаем детальную информацию о task'ах
-            tasks_response = requests.get(
-                f"{SERVICES['airflow']}/api/v1/dags/orchestrator_dag/dagRuns/{dag_run_id}/taskInstances",
-                headers={'Authorization': 'Basic YWRtaW46YWRtaW4='},
-                timeout=10
-            )
+            tasks_response = AIRFLOW.get(TASK_INSTANCES_URL.format(dag_run_id), timeout=10)
             
             task_details = []
             current_step = None
@@ -262,22 +286,80 @@ def get_task_status(task_id):
         logger.error(f"Ошибка получения статуса: {e}")
         return jsonify({'error': 'Ошибка получения статуса задачи'}), 500
 
+WAIT_MAX_SECONDS = 60
+WAIT_MAX_DELAY = 15
+FINAL_DAG_STATES = ('success', 'failed')
+
+@app.route('/api/v1/status/<task_id>/wait', methods=['GET'])
+def wait_task_status(task_id):
+    """
+    Long-poll ожидание завершения задачи.
+    Опрашивает Airflow с экспоненциальной задержкой и jitter, чтобы клиент
+    делал один блокирующий запрос вместо десятков опросов /status
+    """
+    timeout = request.args.get('timeout', WAIT_MAX_SECONDS, type=float)
+    # nan/inf сделали бы deadline бесконечным и заняли поток воркера навсегда
+    if not math.isfinite(timeout):
+        return jsonify({'error': 'Недопустимое значение timeout'}), 400
+    timeout = min(max(timeout, 0.0), WAIT_MAX_SECONDS)
+    deadline = time.monotonic() + timeout
+    dag_run_url = DAG_RUN_URL.format(f"pdf_convert_{task_id}")
+    state = 'unknown'
+    attempt = 0
+    
+    try:
+        while True:
+            response = AIRFLOW.get(dag_run_url, timeout=10)
+            if response.status_code == 404:
+                return jsonify({'error': 'Задача не найдена'}), 404
+            if response.status_code != 200:
+                return jsonify({'error': f'Ошибка получения статуса: {response.status_code}'}), 500
+            
+            state = response.json().get('state', 'unknown')
+            if state in FINAL_DAG_STATES:
+                return get_task_status(task_id)
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            delay = min(1.5 ** attempt + random.random(), WAIT_MAX_DELAY, remaining)
+            time.sleep(delay)
+            attempt += 1
+    
+    except Exception as e:
+        logger.error(f"Ошибка ожидания статуса: {e}")
+        return jsonify({'error': 'Ошибка получения статуса задачи'}), 500
+    
+    # Задача ещё выполняется — клиент может повторить ожидание
+    return jsonify({
+        'task_id': task_id,
+        'status': state,
+        'tracking_url': f"/api/v1/status/{task_id}",
+        'wait_url': f"/api/v1/status/{task_id}/wait"
+    }), 202
+
 @app.route('/api/v1/download/<task_id>', methods=['GET'])
 def download_result(task_id):
     """Скачивание результата обработки"""
     output_dir = os.getenv('OUTPUT_DIR', '/app/output')
     
-    # Поиск файлов результата
-    possible_files = [
-        f"{output_dir}/{task_id}.md",
-        f"{output_dir}/{task_id}.zip",
-        f"{output_dir}/pdf_convert_{task_id}.md",
-        f"{output_dir}/pdf_convert_{task_id}.zip"
-    ]
+    # Поиск файлов результата (в порядке приоритета) за один проход по каталогу
+    possible_names = (
+        f"{task_id}.md",
+        f"{task_id}.zip",
+        f"pdf_convert_{task_id}.md",
+        f"pdf_convert_{task_id}.zip"
+    )
+    try:
+        with os.scandir(output_dir) as entries:
+            found = {entry.name for entry in entries
+                     if entry.name in possible_names and entry.is_file()}
+    except FileNotFoundError:
+        found = set()
     
-    for result_path in possible_files:
-        if os.path.exists(result_path):
-            return send_file(result_path, as_attachment=True)
+    for name in possible_names:
+        if name in found:
+            return send_file(os.path.join(output_dir, name), as_attachment=True)
     
     return jsonify({'error': 'Файл результата не найден'}), 404
 
@@ -286,7 +368,7 @@ def get_quality_report(task_id):
     """Получение отчета о качестве обработки"""
     try:
         response = requests.get(
-            f"{SERVICES['quality_assurance']}/api/report/{task_id}",
+            f"{SERVICES.quality_assurance}/api/report/{task_id}",
             timeout=10
         )
         
@@ -304,6 +386,9 @@ def get_quality_report(task_id):
 @app.route('/api/v1/batch/convert', methods=['POST'])
 def batch_convert():
     """Пакетная обработка нескольких PDF файлов"""
+    if request_too_large():
+        return jsonify({'error': 'Пакет файлов слишком большой'}), 413
+    
     files = request.files.getlist('files')
     if not files or len(files) == 0:
         return jsonify({'error': 'Файлы не найдены в запросе'}), 400
@@ -312,7 +397,7 @@ def batch_convert():
     quality_level = request.form.get('quality_level', 'high')
     enable_qa = request.form.get('enable_qa', 'true').lower() == 'true'
     
-    batch_id = int(time.time())
+    batch_id = uuid.uuid4().hex[:16]
     task_ids = []
     failed_files = []
     
@@ -343,16 +428,12 @@ def batch_convert():
                 })
                 
                 # Запуск DAG для каждого файла
-                requests.post(
-                    f"{SERVICES['airflow']}/api/v1/dags/orchestrator_dag/dagRuns",
+                AIRFLOW.post(
+                    DAG_RUNS_URL,
                     json={
                         'conf': task_config,
                         'dag_run_id': task_id
                     },
-                    headers={
-                        'Content-Type': 'application/json',
-                        'Authorization': 'Basic YWRtaW46YWRtaW4='
-                    },
                     timeout=30
                 )
                 
@@ -382,12 +463,7 @@ def get_batch_status(batch_id):
     """Получение статуса пакетной обработки"""
     try:
         # Поиск всех задач пакета
-        response = requests.get(
-            f"{SERVICES['airflow']}/api/v1/dags/orchestrator_dag/dagRuns",
-            params={'limit': 100},
-            headers={'Authorization': 'Basic YWRtaW46YWRtaW4='},
-            timeout=10
-        )
+        response = AIRFLOW.get(DAG_RUNS_URL, params={'limit': 100}, timeout=10)
         
         if response.status_code == 200:
             dag_runs = response.json().get('dag_runs', [])
@@ -442,7 +518,7 @@ def get_batch_status(batch_id):
 def get_vllm_models():
     """Получение списка доступных моделей vLLM"""
     try:
-        response = requests.get(f"{SERVICES['vllm']}/v1/models", timeout=10)
+        response = requests.get(f"{SERVICES.vllm}/v1/models", timeout=10)
         if response.status_code == 200:
             return jsonify(response.json())
         else:
@@ -466,12 +542,7 @@ def get_system_stats():
     
     # Получение статистики из Airflow
     try:
-        response = requests.get(
-            f"{SERVICES['airflow']}/api/v1/dags/orchestrator_dag/dagRuns",
-            params={'limit': 100},
-            headers={'Authorization': 'Basic YWRtaW46YWRtaW4='},
-            timeout=10
-        )
+        response = AIRFLOW.get(DAG_RUNS_URL, params={'limit': 100}, timeout=10)
         
         if response.status_code == 200:
             dag_runs = response.json().get('dag_runs', [])
@@ -486,13 +557,18 @@ def get_system_stats():
     except Exception as e:
         logger.error(f"Ошибка получения статистики: {e}")
     
-    # Статус каждого сервиса
-    for service_name, url in SERVICES.items():
-        try:
-            response = requests.get(f"{url}/health", timeout=3)
-            stats['services_status'][service_name] = 'healthy' if response.status_code == 200 else 'unhealthy'
-        except:
-            stats['services_status'][service_name] = 'unavailable'
+    # Статус каждого сервиса (опрашиваем параллельно)
+    with ThreadPoolExecutor(max_workers=len(SERVICE_ITEMS)) as executor:
+        futures = {
+            service_name: executor.submit(requests.get, f"{url}/health", timeout=3)
+            for service_name, url in SERVICE_ITEMS
+        }
+        for service_name, future in futures.items():
+            try:
+                response = future.result()
+                stats['services_status'][service_name] = 'healthy' if response.status_code == 200 else 'unhealthy'
+            except Exception:
+                stats['services_status'][service_name] = 'unavailable'
     
     return jsonify(stats)
 
@@ -505,7 +581,7 @@ def get_config():
         'supported_languages': ['original', 'ru', 'en', 'zh'],
         'quality_levels': ['basic', 'high', 'maximum'],
         'supported_formats': ['pdf'],
-        'services': {name: url for name, url in SERVICES.items()},
+        'services': {name: url for name, url in SERVICE_ITEMS},
         'features': {
             'ocr_support': True,
             'quality_assurance': True,
@@ -533,4 +609,5 @@ def create_directories():
 create_directories()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
+    # Только для локальной отладки; в контейнере используется gunicorn (gunicorn.conf.py)
+    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
\ No newline at end of file
@@ -0,0 +1,19 @@
+# Конфигурация Gunicorn для Flask API
+# Каждый эндпоинт делает несколько исходящих HTTP запросов (Airflow, health-check
+# сервисов), поэтому используем gthread воркеры: N процессов × T потоков
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+
+timeout = 120
+keepalive = 2
+max_requests = 1000
+max_requests_jitter = 100
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
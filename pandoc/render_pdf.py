@@ -4,27 +4,39 @@ render_pdf.py — скрипт конвертации Markdown в PDF
 с поддержкой китайских шрифтов и пользовательских шаблонов.
 """
 import os, sys, json, subprocess, datetime
+import logging
+from logging.handlers import RotatingFileHandler
 
 LOG_BASE = "/app/logs"
 LOG_FILE = None
+logger = logging.getLogger("pandoc_render")
 
 def get_log_file():
+    """Путь к лог-файлу; при первом вызове настраивает логгер (файл держится открытым)"""
     global LOG_FILE
     if LOG_FILE is None:
         ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         LOG_FILE = os.path.join(LOG_BASE, f"pandoc_render_{ts}.log")
+        formatter = logging.Formatter("[%(asctime)s] %(message)s")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(formatter)
+        logger.addHandler(console)
+        try:
+            file_handler = RotatingFileHandler(
+                LOG_FILE, maxBytes=10 << 20, backupCount=5, encoding="utf-8"
+            )
+            file_handler.setFormatter(formatter)
+            logger.addHandler(file_handler)
+        except Exception as e:
+            # Fallback: только stdout
+            print(f"LOG_ERR:{e}")
     return LOG_FILE
 
 def write_log(msg):
-    logpath = get_log_file()
-    msg_dt = f"[{datetime.datetime.now().isoformat()}] {msg}"
-    try:
-        with open(logpath, "a", encoding="utf-8") as f:
-            f.write(msg_dt + "\n")
-    except Exception as e:
-        # Fallback на stderr
-        print(f"LOG_ERR:{e}")
-    print(msg_dt)
+    get_log_file()
+    logger.info(msg)
 
 def render_markdown_to_pdf(input_md, output_pdf, template=None):
     try:
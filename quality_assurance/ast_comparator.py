@@ -9,19 +9,24 @@ AST Comparator для PDF Converter Pipeline v4.0
 import os
 import sys
 import asyncio
+import atexit
+import functools
 import logging
 from typing import Dict, List, Optional, Any, Tuple, Union
 import json
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from datetime import datetime
+import time
 
 # NLP и семантическое сравнение
 from sentence_transformers import SentenceTransformer, util
+import numpy as np
 import torch
 
-# Утилиты для сравнения текста
-import difflib
-from textdistance import levenshtein, jaccard
+# Утилиты для сравнения текста (C++ реализация)
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein
 
 # Утилиты
 import structlog
@@ -38,11 +43,151 @@ ast_comparison_requests = Counter('ast_comparison_requests_total', 'AST comparis
 ast_comparison_duration = Histogram('ast_comparison_duration_seconds', 'AST comparison duration')
 ast_similarity_score = Histogram('ast_similarity_score', 'AST structural similarity score')
 
+# Общий кэш моделей sentence transformers: загрузка модели и перенос на GPU
+# занимают секунды, поэтому модель загружается один раз на процесс
+_semantic_models_lock = threading.Lock()
+
+def _cpu_supports_bf16() -> bool:
+    """Есть ли на CPU аппаратная поддержка BF16 (AMX / AVX512-BF16)"""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            flags = f.read()
+        return "amx_bf16" in flags or "avx512_bf16" in flags
+    except OSError:
+        return False
+
+class ONNXSentenceEncoder:
+    """
+    Энкодер на ONNX Runtime (CPU) с тем же контрактом encode(), что у
+    SentenceTransformer: mean pooling + L2 нормализация как у all-MiniLM-L6-v2
+    """
+    
+    def __init__(self, model_name: str, cache_folder: str, onnx_dir: Optional[str] = None):
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+        
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        
+        # Заранее экспортированная модель (optimum-cli export onnx) или экспорт при загрузке
+        source = onnx_dir if onnx_dir and os.path.isdir(onnx_dir) else model_name
+        self.tokenizer = AutoTokenizer.from_pretrained(source, cache_dir=cache_folder)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            source,
+            export=source == model_name,
+            provider="CPUExecutionProvider",
+            session_options=session_options,
+            cache_dir=cache_folder
+        )
+        self.device = torch.device("cpu")
+    
+    def encode(
+        self,
+        sentences: List[str],
+        batch_size: int = 32,
+        convert_to_tensor: bool = True,
+        show_progress_bar: bool = False
+    ) -> torch.Tensor:
+        if not sentences:
+            return torch.empty(0)
+        
+        # Как и SentenceTransformer.encode, сортируем по длине (по убыванию), чтобы
+        # в батче были тексты близкой длины и паддинг был минимальным
+        order = np.argsort([-len(sentence) for sentence in sentences], kind="stable")
+        sorted_sentences = [sentences[i] for i in order]
+        
+        batches = []
+        for start in range(0, len(sorted_sentences), batch_size):
+            inputs = self.tokenizer(
+                sorted_sentences[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                return_tensors="pt"
+            )
+            token_embeddings = self.model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"].unsqueeze(-1).to(token_embeddings.dtype)
+            pooled = (token_embeddings * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            batches.append(torch.nn.functional.normalize(pooled, p=2, dim=1))
+        
+        # Возвращаем исходный порядок
+        return torch.cat(batches)[torch.from_numpy(np.argsort(order))]
+
+@functools.lru_cache(maxsize=4)
+def _load_semantic_model(
+    model_name: str,
+    cache_folder: str,
+    use_onnx: bool = False,
+    onnx_dir: Optional[str] = None,
+    compile_model: bool = False
+) -> Union[SentenceTransformer, ONNXSentenceEncoder]:
+    """Загрузка модели; кэшируется по (имя модели, папка кэша, backend)"""
+    if use_onnx:
+        return ONNXSentenceEncoder(model_name, cache_folder, onnx_dir)
+    
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = SentenceTransformer(model_name, cache_folder=cache_folder, device=device)
+    model.eval()
+    # Embeddings используются только для усредненного косинусного сходства,
+    # потеря точности FP16/BF16 на нем не сказывается. INT8 динамическую
+    # квантизацию не используем: для BERT-подобных энкодеров она заметно
+    # искажает косинусное сходство
+    if device == "cuda":
+        # FP16 на GPU: вдвое меньше трафика памяти, задействуются tensor cores
+        model.half()
+    elif _cpu_supports_bf16():
+        model.to(dtype=torch.bfloat16)
+    if compile_model and device == "cuda":
+        _compile_semantic_model(model)
+    return model
+
+def _compile_semantic_model(model: SentenceTransformer):
+    """torch.compile трансформера: CUDA graphs убирают накладные расходы Python/dispatcher на вызов"""
+    transformer = model[0]
+    eager_model = transformer.auto_model
+    try:
+        transformer.auto_model = torch.compile(
+            eager_model, mode="reduce-overhead", dynamic=False
+        )
+        # Прогрев: компиляция происходит на первом вызове. Для новых длин батча
+        # граф перекомпилируется (до лимита dynamo, дальше — eager)
+        model.encode(["warmup"], convert_to_tensor=True, show_progress_bar=False)
+        logger.info("Semantic model compiled with torch.compile")
+    except Exception as e:
+        transformer.auto_model = eager_model
+        logger.warning(f"torch.compile unavailable, using eager model: {e}")
+
+def _get_semantic_model(
+    model_name: str,
+    cache_folder: str,
+    use_onnx: bool = False,
+    onnx_dir: Optional[str] = None,
+    compile_model: bool = False
+) -> Union[SentenceTransformer, ONNXSentenceEncoder]:
+    """Получение общей модели (lru_cache сам по себе не исключает двойную загрузку из разных потоков)"""
+    with _semantic_models_lock:
+        return _load_semantic_model(model_name, cache_folder, use_onnx, onnx_dir, compile_model)
+
+@atexit.register
+def _release_semantic_models():
+    """Детерминированное освобождение моделей (и памяти GPU) при завершении процесса"""
+    _load_semantic_model.cache_clear()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
 @dataclass
 class ASTComparisonConfig:
     """Конфигурация сравнения AST"""
     # Модель для семантического анализа
     semantic_model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    # Размер батча для encode(); None — подбирается по устройству модели
+    semantic_batch_size: Optional[int] = None
+    embedding_cache_size: int = 50_000
+    # ONNX Runtime для CPU-развертываний (экспорт: optimum-cli export onnx --model <name> <dir>)
+    use_onnx: bool = False
+    onnx_model_dir: Optional[str] = None
+    # torch.compile(mode="reduce-overhead") для модели на GPU
+    compile_model: bool = False
     
     # Веса для разных типов сравнения
     structural_weight: float = 0.7
@@ -51,6 +196,14 @@ class ASTComparisonConfig:
     # Пороги
     similarity_threshold: float = 0.9
     min_node_similarity: float = 0.8
+    # Совпадение по embeddings ниже min_node_similarity + margin считается
+    # неоднозначным и уточняется через Levenshtein
+    node_match_margin: float = 0.05
+    # Если доля точно совпавших заголовков выше порога, семантическое сходство
+    # принимается равным 1.0 без вызова модели (типичный round-trip без перевода)
+    exact_match_skip_ratio: float = 0.95
+    # AST с меньшим суммарным числом узлов сравниваются без передачи в потоки
+    sync_path_max_nodes: int = 32
     
     # Директории
     cache_dir: str = "/app/cache"
@@ -72,6 +225,50 @@ class ASTComparisonResult:
         if self.metadata is None:
             self.metadata = {}
 
+@dataclass
+class FlatAST:
+    """Плоское представление AST в виде параллельных массивов (порядок обхода pre-order)"""
+    titles: List[str]
+    titles_lower: List[str]
+    levels: np.ndarray        # int16, уровень каждого узла
+    title_hashes: np.ndarray  # int64, хэш title_lower каждого узла
+    
+    def __len__(self) -> int:
+        return len(self.titles)
+
+@dataclass
+class CompiledAST:
+    """
+    AST, подготовленный к многократному сравнению (один исходный документ против N переводов).
+    Создается через ASTComparator.compile_ast и используется только с тем же компаратором
+    """
+    flat_nodes: FlatAST
+    level_set: np.ndarray   # уникальные уровни (отсортированы)
+    title_set: np.ndarray   # уникальные хэши заголовков (отсортированы)
+    semantic_titles: List[str]  # непустые заголовки для семантического сравнения
+    # Сумма нормализованных embeddings заголовков; вычисляется при первом семантическом сравнении
+    embedding_sum: Optional[torch.Tensor] = None
+
+def _greedy_unique_matches(scores: np.ndarray, min_score: float) -> Dict[int, Tuple[int, float]]:
+    """
+    Взаимно-однозначное сопоставление строк и столбцов матрицы сходства: пары берутся
+    жадно по убыванию сходства, занятые строка и столбец дальше не участвуют
+    """
+    matches: Dict[int, Tuple[int, float]] = {}
+    used_columns = set()
+    flat_order = np.argsort(-scores, axis=None, kind="stable")
+    for row, column in zip(*np.unravel_index(flat_order, scores.shape)):
+        score = float(scores[row, column])
+        if score < min_score:
+            break
+        if row in matches or column in used_columns:
+            continue
+        matches[int(row)] = (int(column), score)
+        used_columns.add(column)
+        if len(matches) == scores.shape[0] or len(used_columns) == scores.shape[1]:
+            break
+    return matches
+
 # =======================================================================================
 # AST COMPARATOR КЛАСС
 # =======================================================================================
@@ -83,15 +280,26 @@ class ASTComparator:
         self.config = config or ASTComparisonConfig()
         self.logger = structlog.get_logger("ast_comparator")
         
+        # LRU кэш embeddings заголовков: типовые заголовки ("Introduction",
+        # "Conclusion") и исходный документ повторяются между сравнениями
+        self._emb_cache: "OrderedDict[str, torch.Tensor]" = OrderedDict()
+        self._emb_cache_lock = threading.Lock()
+        
         # Инициализируем модель для семантического анализа
         self._initialize_semantic_model()
     
     def _initialize_semantic_model(self):
         """Инициализация модели sentence transformers"""
         try:
-            self.semantic_model = SentenceTransformer(
+            self.semantic_model = _get_semantic_model(
                 self.config.semantic_model_name,
-                cache_folder=self.config.models_dir
+                self.config.models_dir,
+                use_onnx=self.config.use_onnx,
+                onnx_dir=self.config.onnx_model_dir,
+                compile_model=self.config.compile_model
+            )
+            self.encode_batch_size = self.config.semantic_batch_size or (
+                128 if self.semantic_model.device.type == "cuda" else 32
             )
             self.logger.info(f"Semantic model loaded: {self.config.semantic_model_name}")
             
@@ -99,144 +307,224 @@ class ASTComparator:
             self.logger.error(f"Failed to load semantic model: {e}")
             self.semantic_model = None
     
+    def compile_ast(self, ast: Dict[str, Any]) -> CompiledAST:
+        """Предварительная обработка AST для повторных сравнений"""
+        flat_nodes = self._flatten_ast(ast)
+        return CompiledAST(
+            flat_nodes=flat_nodes,
+            level_set=np.unique(flat_nodes.levels),
+            title_set=np.unique(flat_nodes.title_hashes),
+            semantic_titles=[title for title in flat_nodes.titles if title.strip()]
+        )
+    
     async def compare_ast_structures(
         self,
-        original_ast: Dict[str, Any],
-        result_ast: Dict[str, Any],
+        original_ast: Union[Dict[str, Any], CompiledAST],
+        result_ast: Union[Dict[str, Any], CompiledAST],
         comparison_id: str
     ) -> ASTComparisonResult:
         """
         Основное сравнение AST структур
         
         Args:
-            original_ast: AST оригинального документа
-            result_ast: AST результирующего документа
+            original_ast: AST оригинального документа (или результат compile_ast)
+            result_ast: AST результирующего документа (или результат compile_ast)
             comparison_id: Идентификатор сравнения
             
         Returns:
             ASTComparisonResult: Результат сравнения
         """
-        start_time = datetime.now()
+        if self._total_nodes_below(original_ast, result_ast, self.config.sync_path_max_nodes):
+            # Небольшие AST: передача в поток дороже самих вычислений
+            return self._compare_impl_sync(original_ast, result_ast, comparison_id)
+        # Крупные AST считаются в потоке, чтобы не блокировать event loop
+        return await asyncio.to_thread(self._compare_impl_sync, original_ast, result_ast, comparison_id)
+    
+    def _compare_impl_sync(
+        self,
+        original_ast: Union[Dict[str, Any], CompiledAST],
+        result_ast: Union[Dict[str, Any], CompiledAST],
+        comparison_id: str
+    ) -> ASTComparisonResult:
+        """Синхронное сравнение AST структур (без event loop и потоков)"""
+        start_time = time.perf_counter_ns()
         
         try:
             ast_comparison_requests.labels(status='started').inc()
             
-            # Извлекаем плоские списки заголовков
-            original_headers = self._flatten_ast(original_ast)
-            result_headers = self._flatten_ast(result_ast)
-            
-            # Структурное сравнение
-            structural_sim = await self._calculate_structural_similarity(
-                original_headers, result_headers
-            )
-            
-            # Семантическое сравнение
-            semantic_sim = await self._calculate_semantic_similarity(
-                original_headers, result_headers
-            )
-            
-            # Детальное сравнение узлов
-            node_comparisons = await self._compare_individual_nodes(
-                original_headers, result_headers
-            )
+            original, result = self._compile_pair(original_ast, result_ast)
+            exact_match_ratio = self._exact_match_ratio(original, result)
+            skip_semantic = exact_match_ratio > self.config.exact_match_skip_ratio
             
-            # Общий скор
-            overall_similarity = (
-                structural_sim * self.config.structural_weight + 
-                semantic_sim * self.config.semantic_weight
+            structural_sim, semantic_sim, node_comparisons = self._calculate_similarities(
+                original, result, skip_semantic
             )
             
-            # Анализ проблем
-            issues_found, recommendations = self._analyze_issues(
-                original_headers, result_headers, node_comparisons, overall_similarity
-            )
-            
-            # Обновляем метрики
-            processing_time = (datetime.now() - start_time).total_seconds()
-            ast_comparison_duration.observe(processing_time)
-            ast_similarity_score.observe(overall_similarity)
-            ast_comparison_requests.labels(status='success').inc()
-            
-            result = ASTComparisonResult(
-                overall_similarity=overall_similarity,
-                structural_similarity=structural_sim,
-                semantic_similarity=semantic_sim,
-                node_comparisons=node_comparisons,
-                issues_found=issues_found,
-                recommendations=recommendations,
-                processing_time=processing_time,
-                metadata={
-                    "comparison_id": comparison_id,
-                    "original_nodes_count": len(original_headers),
-                    "result_nodes_count": len(result_headers),
-                    "threshold": self.config.similarity_threshold,
-                    "passed": overall_similarity >= self.config.similarity_threshold
-                }
+            return self._build_comparison_result(
+                original, result, structural_sim, semantic_sim, node_comparisons,
+                exact_match_ratio, skip_semantic, comparison_id, start_time
             )
             
-            self.logger.info(
-                f"AST comparison completed",
-                comparison_id=comparison_id,
-                similarity=overall_similarity,
-                structural=structural_sim,
-                semantic=semantic_sim,
-                processing_time=processing_time
-            )
-            
-            return result
-            
         except Exception as e:
             ast_comparison_requests.labels(status='error').inc()
             self.logger.error(f"AST comparison error: {e}")
             raise
     
-    def _flatten_ast(self, ast_node: Dict[str, Any], level: int = 1) -> List[Dict[str, Any]]:
-        """Преобразование дерева AST в плоский список узлов"""
-        nodes = []
+    @staticmethod
+    def _total_nodes_below(
+        original_ast: Union[Dict[str, Any], CompiledAST],
+        result_ast: Union[Dict[str, Any], CompiledAST],
+        limit: int
+    ) -> bool:
+        """Суммарное число узлов меньше limit (обход дерева прерывается по достижении limit)"""
+        total = 0
+        for ast in (original_ast, result_ast):
+            if isinstance(ast, CompiledAST):
+                total += len(ast.flat_nodes)
+                continue
+            stack = [ast] if ast else []
+            while stack and total < limit:
+                node = stack.pop()
+                total += 1
+                # Некорректные узлы не разбираем здесь: ошибку выдаст _compare_impl_sync
+                if isinstance(node, dict):
+                    stack.extend(node.get("children") or ())
+        return total < limit
+    
+    def _compile_pair(
+        self,
+        original_ast: Union[Dict[str, Any], CompiledAST],
+        result_ast: Union[Dict[str, Any], CompiledAST]
+    ) -> Tuple[CompiledAST, CompiledAST]:
+        """Извлекаем плоские списки заголовков (если AST не скомпилирован заранее)"""
+        original = original_ast if isinstance(original_ast, CompiledAST) else self.compile_ast(original_ast)
+        result = result_ast if isinstance(result_ast, CompiledAST) else self.compile_ast(result_ast)
+        return original, result
+    
+    def _calculate_similarities(
+        self,
+        original: CompiledAST,
+        result: CompiledAST,
+        skip_semantic: bool
+    ) -> Tuple[float, float, List[Dict[str, Any]]]:
+        """Последовательный расчет структурного, семантического сходства и сравнения узлов"""
+        structural_sim = self._calculate_structural_similarity(original, result)
+        semantic_sim = 1.0 if skip_semantic else self._calculate_semantic_similarity(original, result)
+        node_comparisons = self._compare_individual_nodes(original.flat_nodes, result.flat_nodes)
+        return structural_sim, semantic_sim, node_comparisons
+    
+    def _build_comparison_result(
+        self,
+        original: CompiledAST,
+        result: CompiledAST,
+        structural_sim: float,
+        semantic_sim: float,
+        node_comparisons: List[Dict[str, Any]],
+        exact_match_ratio: float,
+        skip_semantic: bool,
+        comparison_id: str,
+        start_time: int
+    ) -> ASTComparisonResult:
+        """Общий скор, анализ проблем, метрики"""
+        original_headers = original.flat_nodes
+        result_headers = result.flat_nodes
+        
+        # Общий скор
+        overall_similarity = (
+            structural_sim * self.config.structural_weight + 
+            semantic_sim * self.config.semantic_weight
+        )
+        
+        # Анализ проблем
+        issues_found, recommendations = self._analyze_issues(
+            original_headers, result_headers, node_comparisons, overall_similarity
+        )
         
-        def traverse(node, current_level):
-            # Добавляем текущий узел
-            node_info = {
-                "title": node.get("title", ""),
-                "level": current_level,
-                "full_text": "#" * current_level + " " + node.get("title", ""),
-                "has_children": len(node.get("children", [])) > 0,
-                "child_count": len(node.get("children", []))
+        # Обновляем метрики
+        processing_time = (time.perf_counter_ns() - start_time) / 1e9
+        ast_comparison_duration.observe(processing_time)
+        ast_similarity_score.observe(overall_similarity)
+        ast_comparison_requests.labels(status='success').inc()
+        
+        comparison_result = ASTComparisonResult(
+            overall_similarity=overall_similarity,
+            structural_similarity=structural_sim,
+            semantic_similarity=semantic_sim,
+            node_comparisons=node_comparisons,
+            issues_found=issues_found,
+            recommendations=recommendations,
+            processing_time=processing_time,
+            metadata={
+                "comparison_id": comparison_id,
+                "original_nodes_count": len(original_headers),
+                "result_nodes_count": len(result_headers),
+                "exact_match_ratio": exact_match_ratio,
+                "semantic_skipped": skip_semantic,
+                "threshold": self.config.similarity_threshold,
+                "passed": overall_similarity >= self.config.similarity_threshold
             }
-            nodes.append(node_info)
-            
-            # Рекурсивно обрабатываем детей
-            for child in node.get("children", []):
-                traverse(child, current_level + 1)
+        )
+        
+        self.logger.info(
+            f"AST comparison completed",
+            comparison_id=comparison_id,
+            similarity=overall_similarity,
+            structural=structural_sim,
+            semantic=semantic_sim,
+            processing_time=processing_time
+        )
         
-        if ast_node:
-            traverse(ast_node, level)
+        return comparison_result
+    
+    def _flatten_ast(self, ast_node: Dict[str, Any], level: int = 1) -> FlatAST:
+        """Преобразование дерева AST в плоские массивы узлов (обход в глубину без рекурсии)"""
+        titles = []
+        levels = []
+        
+        stack = [(ast_node, level)] if ast_node else []
+        while stack:
+            node, current_level = stack.pop()
+            titles.append(node.get("title", ""))
+            levels.append(current_level)
+            # В обратном порядке, чтобы сохранить порядок обхода pre-order
+            children = node.get("children") or ()
+            stack.extend((child, current_level + 1) for child in reversed(children))
         
-        return nodes
+        titles_lower = [title.lower() for title in titles]
+        return FlatAST(
+            titles=titles,
+            titles_lower=titles_lower,
+            levels=np.array(levels, dtype=np.int16),
+            title_hashes=np.fromiter(map(hash, titles_lower), dtype=np.int64, count=len(titles_lower))
+        )
     
-    async def _calculate_structural_similarity(
+    def _calculate_structural_similarity(
         self,
-        original_nodes: List[Dict[str, Any]],
-        result_nodes: List[Dict[str, Any]]
+        original: CompiledAST,
+        result: CompiledAST
     ) -> float:
         """Расчет структурного сходства"""
         try:
-            if not original_nodes or not result_nodes:
+            original_nodes = original.flat_nodes
+            result_nodes = result.flat_nodes
+            if not len(original_nodes) or not len(result_nodes):
                 return 0.0
             
-            # Сравниваем структуру по уровням
-            original_levels = [node["level"] for node in original_nodes]
-            result_levels = [node["level"] for node in result_nodes]
-            
-            # Jaccard similarity для уровней
-            original_level_set = set(original_levels)
-            result_level_set = set(result_levels)
-            level_similarity = len(original_level_set & result_level_set) / len(original_level_set | result_level_set)
+            # Jaccard similarity для множеств уровней
+            original_levels = original.level_set
+            result_levels = result.level_set
+            level_similarity = (
+                np.intersect1d(original_levels, result_levels, assume_unique=True).size /
+                np.union1d(original_levels, result_levels).size
+            )
             
-            # Сравниваем заголовки напрямую
-            original_titles = set(node["title"].lower() for node in original_nodes)
-            result_titles = set(node["title"].lower() for node in result_nodes)
-            title_similarity = len(original_titles & result_titles) / len(original_titles | result_titles)
+            # Сравниваем заголовки напрямую (по хэшам)
+            original_titles = original.title_set
+            result_titles = result.title_set
+            title_similarity = (
+                np.intersect1d(original_titles, result_titles, assume_unique=True).size /
+                np.union1d(original_titles, result_titles).size
+            )
             
             # Сравниваем количество узлов
             count_similarity = 1.0 - abs(len(original_nodes) - len(result_nodes)) / max(len(original_nodes), len(result_nodes))
@@ -254,33 +542,50 @@ class ASTComparator:
             self.logger.error(f"Error calculating structural similarity: {e}")
             return 0.0
     
-    async def _calculate_semantic_similarity(
+    @staticmethod
+    def _exact_match_ratio(original: CompiledAST, result: CompiledAST) -> float:
+        """Доля точно совпавших заголовков (от большего из документов, чтобы учитывать и добавленные)"""
+        total = max(len(original.flat_nodes), len(result.flat_nodes))
+        if not total:
+            return 0.0
+        exact_hits = np.isin(original.flat_nodes.title_hashes, result.title_set).sum()
+        return float(exact_hits) / total
+    
+    def _calculate_semantic_similarity(
         self,
-        original_nodes: List[Dict[str, Any]],
-        result_nodes: List[Dict[str, Any]]
+        original: CompiledAST,
+        result: CompiledAST
     ) -> float:
         """Расчет семантического сходства с помощью sentence transformers"""
         try:
-            if not self.semantic_model or not original_nodes or not result_nodes:
-                return 0.0
-            
-            # Извлекаем тексты заголовков
-            original_texts = [node["title"] for node in original_nodes if node["title"].strip()]
-            result_texts = [node["title"] for node in result_nodes if node["title"].strip()]
-            
-            if not original_texts or not result_texts:
+            if not self.semantic_model or not original.semantic_titles or not result.semantic_titles:
                 return 0.0
             
-            # Получаем embeddings
-            original_embeddings = self.semantic_model.encode(original_texts, convert_to_tensor=True)
-            result_embeddings = self.semantic_model.encode(result_texts, convert_to_tensor=True)
-            
-            # Рассчитываем средние векторы
-            original_mean = torch.mean(original_embeddings, dim=0)
-            result_mean = torch.mean(result_embeddings, dim=0)
+            # Embeddings еще не посчитанных документов получаем одним батчем
+            pending = []
+            for compiled in (original, result):
+                if compiled.embedding_sum is None and all(compiled is not p for p in pending):
+                    pending.append(compiled)
+            if pending:
+                embeddings = self._encode_titles([title for p in pending for title in p.semantic_titles])
+                offset = 0
+                for compiled in pending:
+                    count = len(compiled.semantic_titles)
+                    # Сумма нормализованных векторов вместо среднего: косинус не зависит
+                    # от масштаба, поэтому деление на n не нужно. Суммируем в FP32,
+                    # т.к. embeddings могут быть в FP16/BF16
+                    compiled.embedding_sum = torch.nn.functional.normalize(
+                        embeddings[offset:offset + count].float(), dim=1
+                    ).sum(dim=0)
+                    offset += count
+            
+            original_sum = original.embedding_sum
+            result_sum = result.embedding_sum
             
             # Cosine similarity
-            semantic_similarity = float(util.cos_sim(original_mean, result_mean).item())
+            semantic_similarity = float(
+                (original_sum @ result_sum) / (original_sum.norm() * result_sum.norm()).clamp(min=1e-9)
+            )
             
             return max(0.0, semantic_similarity)
             
@@ -288,57 +593,109 @@ class ASTComparator:
             self.logger.error(f"Error calculating semantic similarity: {e}")
             return 0.0
     
-    async def _compare_individual_nodes(
+    def _encode_titles(self, texts: List[str]) -> torch.Tensor:
+        """Embeddings заголовков с LRU кэшем: модель вызывается только для промахов"""
+        with self._emb_cache_lock:
+            return self._encode_titles_locked(texts)
+    
+    def _encode_titles_locked(self, texts: List[str]) -> torch.Tensor:
+        cache = self._emb_cache
+        misses = [text for text in dict.fromkeys(texts) if text not in cache]
+        
+        if misses:
+            new_embeddings = self.semantic_model.encode(
+                misses,
+                batch_size=self.encode_batch_size,
+                convert_to_tensor=True,
+                show_progress_bar=False
+            )
+            for text, embedding in zip(misses, new_embeddings):
+                cache[text] = embedding
+        
+        embeddings = []
+        for text in texts:
+            cache.move_to_end(text)
+            embeddings.append(cache[text])
+        
+        while len(cache) > self.config.embedding_cache_size:
+            cache.popitem(last=False)
+        
+        return torch.stack(embeddings)
+    
+    def _compare_individual_nodes(
         self,
-        original_nodes: List[Dict[str, Any]],
-        result_nodes: List[Dict[str, Any]]
+        original_nodes: FlatAST,
+        result_nodes: FlatAST
     ) -> List[Dict[str, Any]]:
-        """Детальное сравнение отдельных узлов"""
+        """
+        Детальное сравнение отдельных узлов. Сопоставление взаимно-однозначное:
+        каждый узел результата достается не более чем одному исходному узлу
+        """
         node_comparisons = []
         
         try:
-            # Создаем маппинг по заголовкам для быстрого поиска
-            result_nodes_map = {node["title"].lower(): node for node in result_nodes}
-            
-            for orig_node in original_nodes:
-                orig_title_lower = orig_node["title"].lower()
+            # Заголовок -> индексы узлов результата (дубликаты разбираются по порядку)
+            result_title_indices: Dict[str, List[int]] = {}
+            for idx, title_lower in enumerate(result_nodes.titles_lower):
+                result_title_indices.setdefault(title_lower, []).append(idx)
+            # Уровни как списки int: скалярный доступ к ndarray в цикле медленнее
+            original_levels = original_nodes.levels.tolist()
+            result_levels = result_nodes.levels.tolist()
+            
+            # Точные совпадения занимают узлы результата первыми
+            matches: Dict[int, Tuple[int, float]] = {}
+            for i, title_lower in enumerate(original_nodes.titles_lower):
+                candidates = result_title_indices.get(title_lower)
+                if candidates:
+                    matches[i] = (candidates.pop(0), 1.0)
+            taken = np.zeros(len(result_nodes), dtype=bool)
+            taken[[idx for idx, _ in matches.values()]] = True
+            
+            # Остальные — по матрице сходства со свободными узлами: embeddings одной
+            # матрицей косинусного сходства, неоднозначные строки (лучший кандидат ниже
+            # min_node_similarity + margin) уточняются Levenshtein (rapidfuzz cdist)
+            unmatched = [i for i in range(len(original_nodes)) if i not in matches]
+            if unmatched and not taken.all():
+                scores = self._semantic_similarity_matrix(
+                    [original_nodes.titles[i] for i in unmatched], result_nodes
+                )
+                if scores is None:
+                    scores = np.zeros((len(unmatched), len(result_nodes)), dtype=np.float32)
+                scores[:, taken] = 0.0
+                
+                accept_threshold = self.config.min_node_similarity + self.config.node_match_margin
+                ambiguous = np.flatnonzero(scores.max(axis=1) < accept_threshold)
+                if ambiguous.size:
+                    levenshtein_scores = self._levenshtein_similarity_matrix(
+                        [original_nodes.titles_lower[unmatched[row]] for row in ambiguous], result_nodes
+                    )
+                    levenshtein_scores[:, taken] = 0.0
+                    scores[ambiguous] = np.maximum(scores[ambiguous], levenshtein_scores)
                 
-                # Ищем точное соответствие
-                if orig_title_lower in result_nodes_map:
-                    result_node = result_nodes_map[orig_title_lower]
-                    similarity = 1.0
+                for row, (result_idx, similarity) in _greedy_unique_matches(
+                    scores, self.config.min_node_similarity
+                ).items():
+                    matches[unmatched[row]] = (result_idx, similarity)
+            
+            for i, orig_title_lower in enumerate(original_nodes.titles_lower):
+                result_idx, similarity = matches.get(i, (None, 0.0))
+                if result_idx is None:
+                    match_type = "missing"
+                elif result_nodes.titles_lower[result_idx] == orig_title_lower:
                     match_type = "exact"
                 else:
-                    # Ищем приближенное соответствие
-                    best_match = None
-                    best_similarity = 0.0
-                    
-                    for result_node in result_nodes:
-                        # Используем Levenshtein distance
-                        sim = 1.0 - (levenshtein.distance(orig_title_lower, result_node["title"].lower()) / 
-                                    max(len(orig_title_lower), len(result_node["title"].lower())))
-                        
-                        if sim > best_similarity:
-                            best_similarity = sim
-                            best_match = result_node
-                    
-                    if best_match and best_similarity >= self.config.min_node_similarity:
-                        result_node = best_match
-                        similarity = best_similarity
-                        match_type = "approximate"
-                    else:
-                        result_node = None
-                        similarity = 0.0
-                        match_type = "missing"
+                    match_type = "approximate"
                 
+                orig_level = original_levels[i]
+                result_level = result_levels[result_idx] if result_idx is not None else None
                 comparison = {
-                    "original_title": orig_node["title"],
-                    "original_level": orig_node["level"],
-                    "result_title": result_node["title"] if result_node else None,
-                    "result_level": result_node["level"] if result_node else None,
+                    "original_title": original_nodes.titles[i],
+                    "original_level": orig_level,
+                    "result_title": result_nodes.titles[result_idx] if result_idx is not None else None,
+                    "result_level": result_level,
                     "similarity": similarity,
                     "match_type": match_type,
-                    "level_match": (orig_node["level"] == result_node["level"]) if result_node else False
+                    "level_match": orig_level == result_level
                 }
                 
                 node_comparisons.append(comparison)
@@ -349,10 +706,46 @@ class ASTComparator:
             self.logger.error(f"Error comparing individual nodes: {e}")
             return []
     
+    def _semantic_similarity_matrix(
+        self,
+        titles: List[str],
+        result_nodes: FlatAST
+    ) -> Optional[np.ndarray]:
+        """Матрица косинусного сходства заголовков с узлами результата (None без модели)"""
+        if not self.semantic_model or not titles or not len(result_nodes):
+            return None
+        
+        try:
+            original_embeddings = self._encode_titles(titles)
+            result_embeddings = self._encode_titles(result_nodes.titles)
+            
+            return util.cos_sim(original_embeddings, result_embeddings).float().cpu().numpy()
+            
+        except Exception as e:
+            self.logger.warning(f"Semantic node matching failed, using Levenshtein only: {e}")
+            return None
+    
+    def _levenshtein_similarity_matrix(
+        self,
+        titles_lower: List[str],
+        result_nodes: FlatAST
+    ) -> np.ndarray:
+        """Матрица нормализованного Levenshtein сходства заголовков с узлами результата"""
+        return process.cdist(
+            titles_lower,
+            result_nodes.titles_lower,
+            scorer=Levenshtein.normalized_similarity,
+            # Кандидаты ниже порога все равно отбрасываются; cutoff позволяет
+            # rapidfuzz прекращать расчет (bit-parallel Myers) для таких пар раньше
+            score_cutoff=self.config.min_node_similarity,
+            dtype=np.float32,
+            workers=-1
+        )
+    
     def _analyze_issues(
         self,
-        original_nodes: List[Dict[str, Any]],
-        result_nodes: List[Dict[str, Any]],
+        original_nodes: FlatAST,
+        result_nodes: FlatAST,
         node_comparisons: List[Dict[str, Any]],
         overall_similarity: float
     ) -> Tuple[List[str], List[str]]:
@@ -366,18 +759,32 @@ class ASTComparator:
                 issues_found.append(f"Overall similarity ({overall_similarity:.2f}) below threshold ({self.config.similarity_threshold})")
                 recommendations.append("Review document structure and heading consistency")
             
+            # Один проход по сравнениям узлов: пропуски, смена уровней, приблизительные совпадения
+            missing_count = 0
+            missing_titles = []  # Показываем первые 5
+            level_changes = 0
+            approximate_matches = 0
+            for comp in node_comparisons:
+                match_type = comp["match_type"]
+                if match_type == "missing":
+                    missing_count += 1
+                    if len(missing_titles) < 5:
+                        missing_titles.append(comp["original_title"])
+                else:
+                    if not comp["level_match"]:
+                        level_changes += 1
+                    if match_type == "approximate":
+                        approximate_matches += 1
+            
             # Анализируем пропущенные узлы
-            missing_nodes = [comp for comp in node_comparisons if comp["match_type"] == "missing"]
-            if missing_nodes:
-                issues_found.append(f"{len(missing_nodes)} headings not found in result document")
-                missing_titles = [node["original_title"] for node in missing_nodes[:5]]  # Показываем первые 5
+            if missing_count:
+                issues_found.append(f"{missing_count} headings not found in result document")
                 issues_found.append(f"Missing headings: {', '.join(missing_titles)}")
                 recommendations.append("Check for missing sections in document conversion")
             
             # Анализируем изменения уровней
-            level_changes = [comp for comp in node_comparisons if comp["level_match"] == False and comp["match_type"] != "missing"]
             if level_changes:
-                issues_found.append(f"{len(level_changes)} headings have different levels")
+                issues_found.append(f"{level_changes} headings have different levels")
                 recommendations.append("Verify heading hierarchy is preserved correctly")
             
             # Проверяем разницу в количестве узлов
@@ -387,9 +794,8 @@ class ASTComparator:
                 recommendations.append("Review document structure for added or removed sections")
             
             # Анализируем приблизительные совпадения
-            approximate_matches = [comp for comp in node_comparisons if comp["match_type"] == "approximate"]
-            if len(approximate_matches) > len(original_nodes) * 0.2:  # Более 20% приблизительных совпадений
-                issues_found.append(f"{len(approximate_matches)} headings have only approximate matches")
+            if approximate_matches > len(original_nodes) * 0.2:  # Более 20% приблизительных совпадений
+                issues_found.append(f"{approximate_matches} headings have only approximate matches")
                 recommendations.append("Check for translation or formatting inconsistencies in headings")
             
         except Exception as e:
@@ -427,6 +833,16 @@ async def compare_document_structures(
     comparator = create_ast_comparator(config)
     return await comparator.compare_ast_structures(original_ast, result_ast, comparison_id)
 
+def compare_document_structures_sync(
+    original_ast: Dict[str, Any],
+    result_ast: Dict[str, Any],
+    comparison_id: str,
+    config: Optional[ASTComparisonConfig] = None
+) -> ASTComparisonResult:
+    """Синхронный вариант compare_document_structures для вызова вне event loop"""
+    comparator = create_ast_comparator(config)
+    return comparator._compare_impl_sync(original_ast, result_ast, comparison_id)
+
 # =======================================================================================
 # ОСНОВНОЙ БЛОК ДЛЯ ТЕСТИРОВАНИЯ
 # =======================================================================================
@@ -10,20 +10,29 @@ import os
 import sys
 import asyncio
 import logging
-from typing import Dict, List, Optional, Any, Tuple, Union
+from typing import Awaitable, Callable, Dict, List, Optional, Any, Tuple, Union
 import json
 import re
+import functools
+import hashlib
+
+import orjson
 from dataclasses import dataclass
-from datetime import datetime
+import time
 
-# HTTP клиенты для взаимодействия с vLLM
+# HTTP клиент для взаимодействия с vLLM
 import httpx
-import aiohttp
+
+# Кэш результатов коррекции
+import redis.asyncio as aioredis
 
 # Утилиты
 import structlog
 from prometheus_client import Counter, Histogram, Gauge
 
+# Признаки документа (общие с ContentValidator)
+from content_validator import DocumentFeatures, extract_document_features
+
 # =======================================================================================
 # КОНФИГУРАЦИЯ И МЕТРИКИ
 # =======================================================================================
@@ -35,12 +44,144 @@ correction_requests = Counter('correction_requests_total', 'Auto correction requ
 correction_duration = Histogram('correction_duration_seconds', 'Auto correction duration', ['correction_type'])
 corrections_applied = Counter('corrections_applied_total', 'Total corrections applied', ['correction_type'])
 
+# Общие HTTP клиенты к vLLM (по base URL): пул долгоживущих HTTP/1.1 keep-alive соединений,
+# параллельные запросы коррекции переиспользуют соединения вместо нового TCP на каждый запрос
+VLLM_MAX_CONNECTIONS = 64
+VLLM_MAX_KEEPALIVE_CONNECTIONS = 32
+_vllm_clients: Dict[str, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+
+def _get_vllm_client(base_url: str) -> httpx.AsyncClient:
+    """Общий клиент для vLLM сервера (создается заново, если закрыт или из другого event loop)"""
+    loop = asyncio.get_running_loop()
+    cached = _vllm_clients.get(base_url)
+    if cached and cached[0] is loop and not cached[1].is_closed:
+        return cached[1]
+    
+    client = httpx.AsyncClient(
+        base_url=base_url,
+        timeout=httpx.Timeout(600.0),
+        limits=httpx.Limits(
+            max_connections=VLLM_MAX_CONNECTIONS,
+            max_keepalive_connections=VLLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=120
+        )
+    )
+    _vllm_clients[base_url] = (loop, client)
+    return client
+
+# Общие клиенты Redis для кэша результатов коррекции (по URL)
+_redis_clients: Dict[str, Tuple[asyncio.AbstractEventLoop, aioredis.Redis]] = {}
+
+def _get_redis_client(redis_url: str) -> aioredis.Redis:
+    """Общий клиент Redis (создается заново для другого event loop)"""
+    loop = asyncio.get_running_loop()
+    cached = _redis_clients.get(redis_url)
+    if cached and cached[0] is loop:
+        return cached[1]
+    
+    client = aioredis.from_url(redis_url)
+    _redis_clients[redis_url] = (loop, client)
+    return client
+
+async def close_vllm_clients():
+    """Закрытие общих клиентов vLLM и Redis (при остановке сервиса)"""
+    clients = [client for _, client in _vllm_clients.values()]
+    _vllm_clients.clear()
+    for client in clients:
+        if not client.is_closed:
+            await client.aclose()
+    
+    for _, batcher in _correction_batchers.values():
+        batcher.close()
+    _correction_batchers.clear()
+    
+    redis_clients = [client for _, client in _redis_clients.values()]
+    _redis_clients.clear()
+    for client in redis_clients:
+        await client.aclose()
+
+WORD_RE = re.compile(r'\S+')
+
+def _count_words(text: str) -> int:
+    """Число слов (как len(text.split()), но без построения списка)"""
+    return sum(1 for _ in WORD_RE.finditer(text))
+
+# Локальные исправления форматирования
+FORMATTING_DESCRIPTION_PREFIX = "Fix markdown formatting: "
+FIRST_TEXT_LINE_RE = re.compile(r'^[ \t]*(?=\S)', re.MULTILINE)
+IPMITOOL_LINES_RE = re.compile(r'^[ \t]*(?:\$[ \t]*)?ipmitool\b.*(?:\n[ \t]*(?:\$[ \t]*)?ipmitool\b.*)*', re.MULTILINE)
+TAB_ROWS_RE = re.compile(r'^[^\t\n]*\t.*(?:\n[^\t\n]*\t.*)+', re.MULTILINE)
+
+def _fence_command_lines(match: "re.Match[str]") -> str:
+    """Подряд идущие строки ipmitool -> один блок ```bash"""
+    lines = (line.strip() for line in match.group(0).splitlines())
+    return "```bash\n" + "\n".join(lines) + "\n```"
+
+def _tab_rows_to_table(match: "re.Match[str]") -> str:
+    """Строки с табуляцией и одинаковым числом колонок -> markdown таблица"""
+    rows = [[cell.strip() for cell in line.split("\t")] for line in match.group(0).splitlines()]
+    if len({len(row) for row in rows}) != 1:
+        return match.group(0)
+    lines = ["| " + " | ".join(row) + " |" for row in rows]
+    lines.insert(1, "|" + " --- |" * len(rows[0]))
+    return "\n".join(lines)
+
+# Промпты коррекций
+_BASE_CORRECTION_PROMPT = """You are an expert document corrector specializing in technical documentation.
+
+CRITICAL RULES:
+1. PRESERVE all technical commands, API calls, and parameter names
+2. MAINTAIN original document structure and formatting
+3. OUTPUT only the corrected document content
+4. DO NOT add explanations or comments
+
+"""
+
+_TYPE_SPECIFIC_PROMPTS = {
+    "ocr": """
+TASK: Fix OCR recognition errors while preserving technical content.
+- Correct obvious character recognition mistakes
+- Fix spacing and punctuation errors
+- Maintain all IPMI, BMC, Redfish commands exactly as they are
+- Keep Chinese text in Chinese, English text in English
+""",
+    "structure": """
+TASK: Fix document structure and heading hierarchy.
+- Ensure proper markdown heading levels (# ## ### etc.)
+- Maintain logical document flow
+- Preserve all content while improving organization
+- Keep technical sections properly structured
+""",
+    "translation": """
+TASK: Restore missing technical terminology and improve translation quality.
+- Add back missing technical terms (IPMI, BMC, API names)
+- Improve translation consistency
+- Preserve all command syntax and technical parameters
+- Maintain mixed language content where appropriate
+""",
+    "formatting": """
+TASK: Fix markdown formatting issues.
+- Convert tables to proper markdown table format
+- Wrap technical commands in code blocks (```)
+- Fix heading formatting (# ## ###)
+- Preserve all content while improving presentation
+"""
+}
+
+@functools.lru_cache(maxsize=64)
+def _build_correction_prompt(correction_type: str) -> str:
+    """Промпт для типа коррекции (набор типов мал, строки собираются один раз)"""
+    return _BASE_CORRECTION_PROMPT + _TYPE_SPECIFIC_PROMPTS.get(correction_type, _TYPE_SPECIFIC_PROMPTS["formatting"])
+
 @dataclass
 class AutoCorrectorConfig:
     """Конфигурация автокоррекции"""
     # vLLM сервер настройки
     vllm_base_url: str = "http://vllm-server:8000"
     vllm_api_key: str = "vllm-api-key"
+    # Динамический vLLM сервер выбирает модель по типу задачи; точность весов и
+    # KV cache задаются на сервере (VLLM_QUANTIZATION, VLLM_KV_CACHE_DTYPE)
+    vllm_model: str = "Qwen/Qwen2.5-32B-Instruct"
     
     # Пороги для применения коррекций
     ocr_confidence_threshold: float = 0.8
@@ -50,12 +191,30 @@ class AutoCorrectorConfig:
     # Настройки коррекции
     max_corrections_per_document: int = 10
     enable_aggressive_corrections: bool = False
+    # Все коррекции документа одним запросом к vLLM (документ передается один раз)
+    batch_corrections: bool = True
+    # Без объединения — параллельные запросы (continuous batching на стороне vLLM)
+    max_parallel_corrections: int = 4
+    vllm_max_tokens: int = 4096
+    # Минимальная доля слов исходного документа в результате коррекции
+    min_content_ratio: float = 0.7
+    
+    # Сбор запросов коррекции из параллельных конвейеров в пачки
+    enable_request_batching: bool = True
+    max_batch_size: int = 16
+    batch_window_ms: int = 20
+    
+    # Кэш результатов коррекции в Redis (None — без кэша)
+    redis_url: Optional[str] = None
+    correction_cache_ttl: int = 3600
     
     # Типы коррекций
     enable_ocr_correction: bool = True
     enable_structure_correction: bool = True
     enable_translation_correction: bool = True
     enable_formatting_correction: bool = True
+    # Механические исправления форматирования выполняются локально, без vLLM
+    enable_local_formatting: bool = True
     
     # Директории
     temp_dir: str = "/app/temp"
@@ -72,6 +231,13 @@ class CorrectionAction:
     applied: bool = False
     error_message: Optional[str] = None
 
+class CorrectionAbortedError(Exception):
+    """Генерация прервана: результат заведомо не пройдет проверку сохранности контента"""
+    
+    def __init__(self, message: str, partial_content: str):
+        super().__init__(message)
+        self.partial_content = partial_content
+
 @dataclass
 class CorrectionResult:
     """Результат автокоррекции"""
@@ -87,6 +253,87 @@ class CorrectionResult:
         if self.metadata is None:
             self.metadata = {}
 
+class CorrectionBatcher:
+    """
+    Сбор запросов коррекции от параллельно работающих конвейеров: запросы, пришедшие
+    в течение окна (до max_batch_size), отправляются вместе через общий клиент и
+    попадают в один шаг continuous batching vLLM. Одинаковые запросы в пачке
+    (тот же промпт и документ) выполняются один раз
+    """
+    
+    def __init__(self, max_batch_size: int = 16, window_ms: int = 20):
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000
+        self._queue: "asyncio.Queue[Tuple[str, Callable[[], Awaitable[str]], asyncio.Future]]" = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight = set()
+    
+    async def submit(self, key: str, request: Callable[[], Awaitable[str]]) -> str:
+        """Постановка запроса в очередь; key — идентификатор для объединения одинаковых запросов"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((key, request, future))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._collect())
+        return await future
+    
+    def close(self):
+        """Остановка сбора пачек (уже отправленные запросы завершаются сами)"""
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+    
+    async def _collect(self):
+        """Формирование пачек: первый запрос открывает окно, пачка уходит по таймауту или размеру"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Пачка выполняется в фоне, сбор следующей не ждет ее завершения
+            task = asyncio.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+    
+    async def _dispatch(self, batch: List[Tuple[str, Callable[[], Awaitable[str]], asyncio.Future]]):
+        """Параллельная отправка пачки и передача результатов ожидающим"""
+        groups: Dict[str, Tuple[Callable[[], Awaitable[str]], List[asyncio.Future]]] = {}
+        for key, request, future in batch:
+            groups.setdefault(key, (request, []))[1].append(future)
+        
+        results = await asyncio.gather(
+            *(request() for request, _ in groups.values()),
+            return_exceptions=True
+        )
+        for (_, futures), result in zip(groups.values(), results):
+            for future in futures:
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+# Общие сборщики запросов (по base URL vLLM)
+_correction_batchers: Dict[str, Tuple[asyncio.AbstractEventLoop, CorrectionBatcher]] = {}
+
+def _get_correction_batcher(base_url: str, max_batch_size: int, window_ms: int) -> CorrectionBatcher:
+    """Общий сборщик для vLLM сервера (создается заново для другого event loop)"""
+    loop = asyncio.get_running_loop()
+    cached = _correction_batchers.get(base_url)
+    if cached and cached[0] is loop:
+        return cached[1]
+    
+    batcher = CorrectionBatcher(max_batch_size, window_ms)
+    _correction_batchers[base_url] = (loop, batcher)
+    return batcher
+
 # =======================================================================================
 # AUTO CORRECTOR КЛАСС
 # =======================================================================================
@@ -100,22 +347,28 @@ class AutoCorrector:
         
         # HTTP клиент для vLLM
         self.http_client = None
+        self._vllm_headers = {
+            "Authorization": f"Bearer {self.config.vllm_api_key}",
+            "Content-Type": "application/json"
+        }
+        # Ограничение одновременных запросов коррекции к vLLM
+        self._correction_semaphore = asyncio.Semaphore(self.config.max_parallel_corrections)
     
     async def __aenter__(self):
         """Async context manager entry"""
-        self.http_client = aiohttp.ClientSession()
+        self.http_client = _get_vllm_client(self.config.vllm_base_url)
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Async context manager exit"""
-        if self.http_client:
-            await self.http_client.close()
+        """Async context manager exit (общий клиент остается открытым)"""
+        self.http_client = None
     
     async def apply_corrections(
         self,
         document_content: str,
         validation_results: Dict[str, Any],
-        correction_id: str
+        correction_id: str,
+        features: Optional[DocumentFeatures] = None
     ) -> CorrectionResult:
         """
         Применение автоматических коррекций к документу
@@ -124,72 +377,109 @@ class AutoCorrector:
             document_content: Содержимое документа для коррекции
             validation_results: Результаты валидации из всех систем QA
             correction_id: Идентификатор коррекции
+            features: Признаки документа (если уже извлечены в QA main)
             
         Returns:
             CorrectionResult: Результат коррекции
         """
-        start_time = datetime.now()
+        start_time = time.perf_counter_ns()
         
         try:
             correction_requests.labels(correction_type='combined', status='started').inc()
             
-            corrections_to_apply = []
-            
-            # OCR коррекции
-            if self.config.enable_ocr_correction:
-                ocr_corrections = await self._generate_ocr_corrections(
-                    document_content, validation_results.get("ocr_validation", {})
-                )
-                corrections_to_apply.extend(ocr_corrections)
-            
-            # Структурные коррекции
-            if self.config.enable_structure_correction:
-                structure_corrections = await self._generate_structure_corrections(
-                    document_content, validation_results.get("ast_comparison", {})
-                )
-                corrections_to_apply.extend(structure_corrections)
-            
-            # Коррекции перевода
-            if self.config.enable_translation_correction:
-                translation_corrections = await self._generate_translation_corrections(
-                    document_content, validation_results.get("content_validation", {})
-                )
-                corrections_to_apply.extend(translation_corrections)
-            
-            # Форматирование
-            if self.config.enable_formatting_correction:
-                formatting_corrections = await self._generate_formatting_corrections(
-                    document_content, validation_results.get("visual_diff", {})
-                )
-                corrections_to_apply.extend(formatting_corrections)
+            # Генераторы — только локальная работа с regex (под GIL): выполняем их
+            # одним вызовом в потоке, чтобы большие документы не блокировали event loop
+            corrections_to_apply = await asyncio.to_thread(
+                self._generate_corrections, document_content, validation_results, features
+            )
             
-            # Ограничиваем количество коррекций
+            # Коррекции с одинаковым промптом объединяем, затем ограничиваем количество
+            corrections_to_apply = self._deduplicate_corrections(corrections_to_apply)
             corrections_to_apply = corrections_to_apply[:self.config.max_corrections_per_document]
             
             # Применяем коррекции
             corrected_document = document_content
             successful_corrections = 0
             failed_corrections = 0
+            aborted_outputs = []  # Частичный вывод прерванных генераций (для отладки)
             
+            # Применяем только уверенные коррекции
+            confident_corrections = []
             for correction in corrections_to_apply:
-                try:
-                    if correction.confidence >= 0.7:  # Применяем только уверенные коррекции
-                        corrected_document = await self._apply_single_correction(
-                            corrected_document, correction
-                        )
+                if correction.confidence < 0.7:
+                    correction.applied = False
+                    correction.error_message = "Confidence too low"
+                    failed_corrections += 1
+                    continue
+                
+                # Механические исправления форматирования — локально, без запроса к vLLM
+                if correction.type == "formatting" and self.config.enable_local_formatting:
+                    locally_corrected = self._apply_local_formatting_correction(corrected_document, correction)
+                    if locally_corrected is not None:
+                        corrected_document = locally_corrected
+                        correction.corrected_content = locally_corrected
                         correction.applied = True
                         successful_corrections += 1
                         corrections_applied.labels(correction_type=correction.type).inc()
-                    else:
+                        continue
+                
+                confident_corrections.append(correction)
+            
+            if self.config.batch_corrections and len(confident_corrections) > 1:
+                # Один запрос со всеми задачами: prefill документа оплачивается один раз
+                try:
+                    corrected_document = await self._apply_combined_corrections(
+                        corrected_document, confident_corrections
+                    )
+                    for correction in confident_corrections:
+                        correction.applied = True
+                        corrections_applied.labels(correction_type=correction.type).inc()
+                    successful_corrections += len(confident_corrections)
+                    
+                except Exception as e:
+                    for correction in confident_corrections:
+                        correction.applied = False
+                        correction.error_message = str(e)
+                    failed_corrections += len(confident_corrections)
+                    if isinstance(e, CorrectionAbortedError):
+                        aborted_outputs.append(e.partial_content[-500:])
+                    self.logger.warning(f"Failed to apply combined corrections: {e}")
+            elif confident_corrections:
+                # Отдельные запросы параллельно: каждый получает один и тот же документ
+                # (исходный, с уже примененными локальными исправлениями)
+                base_document = corrected_document
+                results = await asyncio.gather(
+                    *(self._apply_single_correction_limited(base_document, correction)
+                      for correction in confident_corrections),
+                    return_exceptions=True
+                )
+                completed = []
+                for correction, result in zip(confident_corrections, results):
+                    if isinstance(result, Exception):
                         correction.applied = False
-                        correction.error_message = "Confidence too low"
+                        correction.error_message = str(result)
                         failed_corrections += 1
-                        
-                except Exception as e:
-                    correction.applied = False
-                    correction.error_message = str(e)
-                    failed_corrections += 1
-                    self.logger.warning(f"Failed to apply correction: {e}")
+                        if isinstance(result, CorrectionAbortedError):
+                            aborted_outputs.append(result.partial_content[-500:])
+                        self.logger.warning(f"Failed to apply correction: {result}")
+                        continue
+                    completed.append((correction, result))
+                
+                # Результаты не объединяются: в документ попадает вариант самой уверенной
+                # коррекции (при равной уверенности — первой по порядку), остальные не применены
+                if completed:
+                    best_correction, corrected_document = max(completed, key=lambda item: item[0].confidence)
+                    for correction, _ in completed:
+                        if correction is best_correction:
+                            correction.applied = True
+                            successful_corrections += 1
+                            corrections_applied.labels(correction_type=correction.type).inc()
+                        else:
+                            correction.applied = False
+                            correction.error_message = (
+                                f"Superseded by higher-confidence {best_correction.type} correction"
+                            )
+                            failed_corrections += 1
             
             # Финальная проверка через vLLM
             if successful_corrections > 0:
@@ -198,7 +488,7 @@ class AutoCorrector:
                 )
             
             # Результат
-            processing_time = (datetime.now() - start_time).total_seconds()
+            processing_time = (time.perf_counter_ns() - start_time) / 1e9
             correction_duration.labels(correction_type='combined').observe(processing_time)
             
             result = CorrectionResult(
@@ -212,7 +502,8 @@ class AutoCorrector:
                     "correction_id": correction_id,
                     "original_length": len(document_content),
                     "corrected_length": len(corrected_document),
-                    "correction_ratio": successful_corrections / len(corrections_to_apply) if corrections_to_apply else 0
+                    "correction_ratio": successful_corrections / len(corrections_to_apply) if corrections_to_apply else 0,
+                    "aborted_partial_outputs": aborted_outputs
                 }
             )
             
@@ -234,7 +525,60 @@ class AutoCorrector:
             self.logger.error(f"Auto correction error: {e}")
             raise
     
-    async def _generate_ocr_corrections(
+    def _generate_corrections(
+        self,
+        document_content: str,
+        validation_results: Dict[str, Any],
+        features: Optional[DocumentFeatures] = None
+    ) -> List[CorrectionAction]:
+        """Генерация всех коррекций (порядок: OCR, структура, перевод, форматирование)"""
+        corrections = []
+        
+        # Признаки документа извлекаются одним проходом и общие для всех генераторов
+        if features is None:
+            features = extract_document_features(document_content)
+        
+        # OCR коррекции
+        if self.config.enable_ocr_correction:
+            corrections.extend(self._generate_ocr_corrections(
+                document_content, validation_results.get("ocr_validation", {})
+            ))
+        
+        # Структурные коррекции
+        if self.config.enable_structure_correction:
+            corrections.extend(self._generate_structure_corrections(
+                document_content, validation_results.get("ast_comparison", {})
+            ))
+        
+        # Коррекции перевода
+        if self.config.enable_translation_correction:
+            corrections.extend(self._generate_translation_corrections(
+                document_content, validation_results.get("content_validation", {}), features
+            ))
+        
+        # Форматирование
+        if self.config.enable_formatting_correction:
+            corrections.extend(self._generate_formatting_corrections(
+                document_content, validation_results.get("visual_diff", {}), features
+            ))
+        
+        return corrections
+    
+    def _deduplicate_corrections(self, corrections: List[CorrectionAction]) -> List[CorrectionAction]:
+        """Объединение коррекций, которые дают один и тот же запрос к vLLM"""
+        unique: Dict[Tuple[str, str], CorrectionAction] = {}
+        for correction in corrections:
+            key = (correction.type, self._get_correction_prompt(correction.type, correction.description))
+            existing = unique.get(key)
+            if existing is None:
+                unique[key] = correction
+                continue
+            # Описания сохраняем все, уверенность — максимальная
+            existing.description = f"{existing.description}; {correction.description}"
+            existing.confidence = max(existing.confidence, correction.confidence)
+        return list(unique.values())
+    
+    def _generate_ocr_corrections(
         self,
         document_content: str,
         ocr_validation: Dict[str, Any]
@@ -267,7 +611,7 @@ class AutoCorrector:
             self.logger.error(f"Error generating OCR corrections: {e}")
             return []
     
-    async def _generate_structure_corrections(
+    def _generate_structure_corrections(
         self,
         document_content: str,
         ast_comparison: Dict[str, Any]
@@ -282,7 +626,8 @@ class AutoCorrector:
             issues = ast_comparison.get("issues_found", [])
             
             for issue in issues:
-                if "heading" in issue.lower() and "missing" in issue.lower():
+                issue_lower = issue.lower()
+                if "heading" in issue_lower and "missing" in issue_lower:
                     correction = CorrectionAction(
                         type="structure",
                         description="Restore missing headings structure",
@@ -292,7 +637,7 @@ class AutoCorrector:
                     )
                     corrections.append(correction)
                 
-                elif "level" in issue.lower():
+                elif "level" in issue_lower:
                     correction = CorrectionAction(
                         type="structure", 
                         description="Fix heading level hierarchy",
@@ -301,26 +646,28 @@ class AutoCorrector:
                         confidence=0.8
                     )
                     corrections.append(correction)
+                
+                if len(corrections) >= 2:  # Максимум 2 структурные коррекции
+                    break
             
-            return corrections[:2]  # Максимум 2 структурные коррекции
+            return corrections
             
         except Exception as e:
             self.logger.error(f"Error generating structure corrections: {e}")
             return []
     
-    async def _generate_translation_corrections(
+    def _generate_translation_corrections(
         self,
         document_content: str,
-        content_validation: Dict[str, Any]
+        content_validation: Dict[str, Any],
+        features: DocumentFeatures
     ) -> List[CorrectionAction]:
         """Генерация коррекций перевода"""
         corrections = []
         
         try:
-            # Ищем проблемы с техническими терминами
-            technical_terms = re.findall(r'[A-Z]{2,}[A-Za-z0-9_-]*', document_content)
-            
-            if len(technical_terms) < 5:  # Слишком мало технических терминов
+            # Ищем проблемы с техническими терминами (счетчик ограничен сверху 5)
+            if features.uppercase_term_count < 5:  # Слишком мало технических терминов
                 correction = CorrectionAction(
                     type="translation",
                     description="Restore technical terminology",
@@ -328,10 +675,10 @@ class AutoCorrector:
                     corrected_content="",
                     confidence=0.6
                 )
-                corrections.append(correction)
+                return [correction]  # Одна коррекция перевода
             
             # Проверяем наличие IPMI/BMC команд
-            if "ipmi" not in document_content.lower() and "bmc" not in document_content.lower():
+            if not features.has_ipmi and not features.has_bmc:
                 correction = CorrectionAction(
                     type="translation",
                     description="Restore IPMI/BMC command references",
@@ -341,16 +688,17 @@ class AutoCorrector:
                 )
                 corrections.append(correction)
             
-            return corrections[:1]  # Одна коррекция перевода
+            return corrections
             
         except Exception as e:
             self.logger.error(f"Error generating translation corrections: {e}")
             return []
     
-    async def _generate_formatting_corrections(
+    def _generate_formatting_corrections(
         self,
         document_content: str,
-        visual_diff: Dict[str, Any]
+        visual_diff: Dict[str, Any],
+        features: DocumentFeatures
     ) -> List[CorrectionAction]:
         """Генерация коррекций форматирования"""
         corrections = []
@@ -360,33 +708,67 @@ class AutoCorrector:
             issues = []
             
             # Проверяем заголовки
-            if not re.search(r'^#{1,6}\s+.+$', document_content, re.MULTILINE):
+            if not features.has_headings:
                 issues.append("No markdown headings found")
             
             # Проверяем таблицы
-            if '|' not in document_content and 'table' in document_content.lower():
+            if not features.has_table_pipes and features.mentions_table:
                 issues.append("Tables not in markdown format")
             
             # Проверяем код блоки
-            if 'ipmi' in document_content.lower() and '```' not in document_content:
+            if features.has_ipmi and not features.has_code_fence:
                 issues.append("Code blocks not formatted")
             
             for issue in issues:
                 correction = CorrectionAction(
                     type="formatting",
-                    description=f"Fix markdown formatting: {issue}",
+                    description=f"{FORMATTING_DESCRIPTION_PREFIX}{issue}",
                     original_content=document_content,
                     corrected_content="",
                     confidence=0.9
                 )
                 corrections.append(correction)
+                if len(corrections) >= 2:  # Максимум 2 коррекции форматирования
+                    break
             
-            return corrections[:2]  # Максимум 2 коррекции форматирования
+            return corrections
             
         except Exception as e:
             self.logger.error(f"Error generating formatting corrections: {e}")
             return []
     
+    def _apply_local_formatting_correction(self, content: str, correction: CorrectionAction) -> Optional[str]:
+        """
+        Локальное применение коррекции форматирования (описание может содержать
+        несколько проблем после дедупликации). None — нужен vLLM
+        """
+        corrected = content
+        for description in correction.description.split("; "):
+            if not description.startswith(FORMATTING_DESCRIPTION_PREFIX):
+                return None
+            issue = description[len(FORMATTING_DESCRIPTION_PREFIX):]
+            fixed = self._apply_local_formatting(corrected, issue)
+            # Не поддерживается или эвристика ничего не нашла
+            if fixed is None or fixed == corrected:
+                return None
+            corrected = fixed
+        return corrected
+    
+    def _apply_local_formatting(self, content: str, issue: str) -> Optional[str]:
+        """Детерминированное исправление одной проблемы форматирования (None — не поддерживается)"""
+        if issue == "No markdown headings found":
+            # Первая непустая строка становится заголовком
+            return FIRST_TEXT_LINE_RE.sub("# ", content, count=1)
+        
+        if issue == "Code blocks not formatted":
+            return IPMITOOL_LINES_RE.sub(_fence_command_lines, content)
+        
+        if issue == "Tables not in markdown format":
+            # Без '|' в документе строки таблиц обычно разделены табуляцией
+            return TAB_ROWS_RE.sub(_tab_rows_to_table, content)
+        
+        return None
+    
     async def _apply_single_correction(
         self,
         document_content: str,
@@ -394,86 +776,169 @@ class AutoCorrector:
     ) -> str:
         """Применение одной коррекции через vLLM"""
         try:
-            if not self.http_client:
-                self.http_client = aiohttp.ClientSession()
-            
             # Формируем промпт для коррекции
             system_prompt = self._get_correction_prompt(correction.type, correction.description)
             
-            # Запрос к vLLM
-            async with self.http_client.post(
-                f"{self.config.vllm_base_url}/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.config.vllm_api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "Qwen/Qwen2.5-32B-Instruct",
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": document_content}
-                    ],
-                    "temperature": 0.1,
-                    "max_tokens": 4096
-                }
-            ) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    corrected_content = result["choices"][0]["message"]["content"]
-                    correction.corrected_content = corrected_content
-                    return corrected_content
-                else:
-                    raise Exception(f"vLLM request failed: {response.status}")
+            corrected_content = await self._request_correction(system_prompt, document_content)
+            correction.corrected_content = corrected_content
+            return corrected_content
                     
         except Exception as e:
             self.logger.error(f"Error applying correction: {e}")
             raise
     
-    def _get_correction_prompt(self, correction_type: str, description: str) -> str:
-        """Получение промпта для коррекции определенного типа"""
+    async def _apply_single_correction_limited(
+        self,
+        document_content: str,
+        correction: CorrectionAction
+    ) -> str:
+        """Применение коррекции с ограничением параллельных запросов"""
+        async with self._correction_semaphore:
+            return await self._apply_single_correction(document_content, correction)
+    
+    async def _apply_combined_corrections(
+        self,
+        document_content: str,
+        corrections: List[CorrectionAction]
+    ) -> str:
+        """Применение нескольких коррекций одним запросом к vLLM"""
+        try:
+            system_prompt = self._get_combined_correction_prompt(corrections)
+            
+            corrected_content = await self._request_correction(system_prompt, document_content)
+            for correction in corrections:
+                correction.corrected_content = corrected_content
+            return corrected_content
+            
+        except Exception as e:
+            self.logger.error(f"Error applying combined corrections: {e}")
+            raise
+    
+    async def _request_correction(self, system_prompt: str, document_content: str) -> str:
+        """Запрос коррекции с кэшем в Redis по хэшу промпта и документа"""
+        request_hash = hashlib.sha256(
+            f"{self.config.vllm_model}\0{system_prompt}\0{document_content}".encode("utf-8")
+        ).hexdigest()
+        if not self.config.redis_url:
+            return await self._submit_vllm_correction(request_hash, system_prompt, document_content)
         
-        base_prompt = """You are an expert document corrector specializing in technical documentation.
-
-CRITICAL RULES:
-1. PRESERVE all technical commands, API calls, and parameter names
-2. MAINTAIN original document structure and formatting
-3. OUTPUT only the corrected document content
-4. DO NOT add explanations or comments
-
-"""
+        cache_key = "qa:correction:" + request_hash
         
-        type_specific = {
-            "ocr": """
-TASK: Fix OCR recognition errors while preserving technical content.
-- Correct obvious character recognition mistakes
-- Fix spacing and punctuation errors
-- Maintain all IPMI, BMC, Redfish commands exactly as they are
-- Keep Chinese text in Chinese, English text in English
-""",
-            "structure": """
-TASK: Fix document structure and heading hierarchy.
-- Ensure proper markdown heading levels (# ## ### etc.)
-- Maintain logical document flow
-- Preserve all content while improving organization
-- Keep technical sections properly structured
-""",
-            "translation": """
-TASK: Restore missing technical terminology and improve translation quality.
-- Add back missing technical terms (IPMI, BMC, API names)
-- Improve translation consistency
-- Preserve all command syntax and technical parameters
-- Maintain mixed language content where appropriate
-""",
-            "formatting": """
-TASK: Fix markdown formatting issues.
-- Convert tables to proper markdown table format
-- Wrap technical commands in code blocks (```)
-- Fix heading formatting (# ## ###)
-- Preserve all content while improving presentation
-"""
-        }
+        try:
+            cached = await _get_redis_client(self.config.redis_url).get(cache_key)
+            if cached is not None:
+                return cached.decode("utf-8")
+        except Exception as e:
+            self.logger.warning(f"Correction cache read failed: {e}")
+        
+        corrected_content = await self._submit_vllm_correction(request_hash, system_prompt, document_content)
+        
+        try:
+            await _get_redis_client(self.config.redis_url).setex(
+                cache_key, self.config.correction_cache_ttl, corrected_content.encode("utf-8")
+            )
+        except Exception as e:
+            self.logger.warning(f"Correction cache write failed: {e}")
+        
+        return corrected_content
+    
+    async def _submit_vllm_correction(self, request_hash: str, system_prompt: str, document_content: str) -> str:
+        """Запрос к vLLM через общий сборщик пачек (или напрямую, если он отключен)"""
+        if not self.config.enable_request_batching:
+            return await self._request_vllm_correction(system_prompt, document_content)
+        
+        batcher = _get_correction_batcher(
+            self.config.vllm_base_url, self.config.max_batch_size, self.config.batch_window_ms
+        )
+        return await batcher.submit(
+            request_hash,
+            functools.partial(self._request_vllm_correction, system_prompt, document_content)
+        )
+    
+    async def _request_vllm_correction(self, system_prompt: str, document_content: str) -> str:
+        """Запрос к vLLM chat completions"""
+        http_client = self.http_client or _get_vllm_client(self.config.vllm_base_url)
+        max_tokens = self.config.vllm_max_tokens
+        # Каждое слово — минимум один токен: если даже остаток бюджета токенов
+        # не позволяет набрать нужное число слов, генерацию можно прервать
+        min_words = _count_words(document_content) * self.config.min_content_ratio
+        if min_words > max_tokens:
+            raise CorrectionAbortedError(
+                f"Document too long for max_tokens={max_tokens}: output cannot preserve enough content", ""
+            )
+        
+        # Чанки накапливаются как есть и склеиваются один раз в конце
+        chunks = []
+        words = 0
+        tokens = 0
+        in_word = False
+        # Тело сериализуем orjson: документ может занимать сотни КБ
+        body = orjson.dumps({
+            "model": self.config.vllm_model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": document_content}
+            ],
+            "temperature": 0.1,
+            "max_tokens": max_tokens,
+            "stream": True
+        })
+        async with http_client.stream(
+            "POST",
+            "/v1/chat/completions",
+            headers=self._vllm_headers,
+            content=body
+        ) as response:
+            if response.status_code != 200:
+                raise Exception(f"vLLM request failed: {response.status_code}")
+            
+            # Server-sent events: строки "data: {...}", завершение — "data: [DONE]"
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                
+                chunk = orjson.loads(data)["choices"][0]["delta"].get("content")
+                if not chunk:
+                    continue
+                chunks.append(chunk)
+                tokens += 1  # vLLM отдает примерно по токену на чанк
+                
+                # Подсчет слов нарастающим итогом: если предыдущий чанк оборвался
+                # на середине слова, первое слово чанка — его продолжение
+                chunk_words = _count_words(chunk)
+                if chunk_words and in_word and not chunk[0].isspace():
+                    chunk_words -= 1
+                words += chunk_words
+                in_word = not chunk[-1].isspace()
+                
+                if words + (max_tokens - tokens) < min_words:
+                    # Выход из контекста stream закрывает соединение и отменяет генерацию
+                    raise CorrectionAbortedError(
+                        f"Correction aborted after {tokens} tokens: output cannot preserve enough content",
+                        "".join(chunks)
+                    )
+        
+        return "".join(chunks)
+    
+    def _get_correction_prompt(self, correction_type: str, description: str) -> str:
+        """Получение промпта для коррекции определенного типа"""
+        return _build_correction_prompt(correction_type)
+    
+    def _get_combined_correction_prompt(self, corrections: List[CorrectionAction]) -> str:
+        """Промпт со всеми задачами коррекции (по одной TASK i на тип, с перечнем проблем)"""
+        issues_by_type: Dict[str, List[str]] = {}
+        for correction in corrections:
+            correction_type = correction.type if correction.type in _TYPE_SPECIFIC_PROMPTS else "formatting"
+            issues_by_type.setdefault(correction_type, []).append(correction.description)
         
-        return base_prompt + type_specific.get(correction_type, type_specific["formatting"])
+        sections = []
+        for i, (correction_type, descriptions) in enumerate(issues_by_type.items(), 1):
+            section = _TYPE_SPECIFIC_PROMPTS[correction_type].replace("TASK:", f"TASK {i}:", 1)
+            sections.append(section + "".join(f"- Issue: {d}\n" for d in descriptions))
+        return _BASE_CORRECTION_PROMPT + "".join(sections) + "\nApply ALL tasks above in a single pass.\n"
     
     async def _final_review_correction(
         self,
@@ -484,11 +949,11 @@ TASK: Fix markdown formatting issues.
         """Финальный обзор и валидация коррекций"""
         try:
             # Простая проверка - не потерялся ли контент значительно
-            original_length = len(original_content.split())
-            corrected_length = len(corrected_content.split())
+            original_length = _count_words(original_content)
+            corrected_length = _count_words(corrected_content)
             
-            # Если потерялось более 30% контента, возвращаем оригинал
-            if corrected_length < original_length * 0.7:
+            # Если потерялось слишком много контента, возвращаем оригинал
+            if corrected_length < original_length * self.config.min_content_ratio:
                 self.logger.warning(f"Correction {correction_id} removed too much content, reverting")
                 return original_content
             
@@ -7,8 +7,12 @@ Content Validator для PDF Converter Pipeline v4.0
 """
 
 import re
-from typing import Dict, List, Any, Tuple
+import time
+import itertools
+import functools
+from typing import Dict, List, Any, Optional, Set, FrozenSet, Iterable, Tuple
 from dataclasses import dataclass
+import ahocorasick
 import structlog
 from prometheus_client import Counter, Histogram
 
@@ -18,11 +22,80 @@ logger = structlog.get_logger("content_validator")
 content_validation_requests = Counter('content_validation_requests_total', 'Content validation requests', ['status'])
 content_validation_duration = Histogram('content_validation_duration_seconds', 'Content validation duration')
 
+# Регулярные выражения компилируются один раз
+HEADING_RE = re.compile(r'^#{1,6}\s+.+$', re.MULTILINE)
+CODEBLOCK_RE = re.compile(r'```[\s\S]*?```')
+TECHNICAL_TERM_RE = re.compile(r'[A-Z]{2,}[A-Za-z0-9_-]*')
+
+# Ключевые слова, которые проверяют генераторы коррекций
+FEATURE_KEYWORDS = ('ipmi', 'bmc', 'table', 'command')
+# Генератору перевода достаточно знать, что терминов вида [A-Z]{2,} не меньше 5
+UPPERCASE_TERMS_CAP = 5
+
+# =======================================================================================
+# ПРИЗНАКИ ДОКУМЕНТА
+# =======================================================================================
+
+@dataclass
+class DocumentFeatures:
+    """Структурные признаки документа, вычисляемые один раз для всех проверок QA"""
+    has_headings: bool
+    code_block_count: int
+    has_code_fence: bool
+    has_table_pipes: bool
+    has_ipmi: bool
+    has_bmc: bool
+    mentions_table: bool
+    mentions_command: bool
+    technical_term_count: int
+    tech_terms: Set[str]
+    uppercase_term_count: int
+
+@functools.lru_cache(maxsize=8)
+def _build_features_automaton(terms: FrozenSet[str]) -> Any:
+    """Автомат Aho–Corasick по терминам и ключевым словам (строится один раз на набор)"""
+    automaton = ahocorasick.Automaton()
+    for word in terms.union(FEATURE_KEYWORDS):
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
+def extract_document_features(document_content: str, technical_terms: Iterable[str] = ()) -> DocumentFeatures:
+    """
+    Извлечение признаков документа: один проход Aho–Corasick по тексту в нижнем регистре
+    находит и технические термины (включая перекрывающиеся), и ключевые слова генераторов
+    """
+    terms = frozenset(term.lower() for term in technical_terms)
+    words_total = len(terms.union(FEATURE_KEYWORDS))
+    
+    found: Set[str] = set()
+    for _, word in _build_features_automaton(terms).iter(document_content.lower()):
+        found.add(word)
+        if len(found) == words_total:
+            break
+    
+    tech_terms = found & terms
+    return DocumentFeatures(
+        has_headings=HEADING_RE.search(document_content) is not None,
+        code_block_count=sum(1 for _ in CODEBLOCK_RE.finditer(document_content)),
+        has_code_fence='```' in document_content,
+        has_table_pipes='|' in document_content,
+        has_ipmi='ipmi' in found,
+        has_bmc='bmc' in found,
+        mentions_table='table' in found,
+        mentions_command='command' in found,
+        technical_term_count=len(tech_terms),
+        tech_terms=tech_terms,
+        uppercase_term_count=sum(
+            1 for _ in itertools.islice(TECHNICAL_TERM_RE.finditer(document_content), UPPERCASE_TERMS_CAP)
+        )
+    )
+
 @dataclass
 class ContentValidationConfig:
     """Конфигурация валидации содержимого"""
     # Технические термины которые должны сохраняться
-    required_technical_terms: List[str] = None
+    required_technical_terms: Optional[List[str]] = None
     
     # Минимальные требования
     min_technical_terms: int = 5
@@ -47,7 +120,7 @@ class ContentValidationResult:
     technical_terms_found: int
     code_blocks_found: int
     processing_time: float
-    metadata: Dict[str, Any] = None
+    metadata: Optional[Dict[str, Any]] = None
     
     def __post_init__(self):
         if self.metadata is None:
@@ -59,11 +132,21 @@ class ContentValidator:
     def __init__(self, config: Optional[ContentValidationConfig] = None):
         self.config = config or ContentValidationConfig()
         self.logger = structlog.get_logger("content_validator")
+        
+        self._terms_lower = frozenset(term.lower() for term in self.config.required_technical_terms or ())
     
-    async def validate_content(self, document_content: str, document_type: str = "technical") -> ContentValidationResult:
-        """Валидация содержимого документа"""
-        import time
-        start_time = time.time()
+    def extract_features(self, document_content: str) -> DocumentFeatures:
+        """Признаки документа по терминам этого валидатора (для передачи в AutoCorrector)"""
+        return extract_document_features(document_content, self._terms_lower)
+    
+    async def validate_content(
+        self,
+        document_content: str,
+        document_type: str = "technical",
+        features: Optional[DocumentFeatures] = None
+    ) -> ContentValidationResult:
+        """Валидация содержимого документа (features — заранее извлеченные признаки)"""
+        start_time = time.perf_counter()
         
         try:
             content_validation_requests.labels(status='started').inc()
@@ -71,20 +154,23 @@ class ContentValidator:
             issues_found = []
             recommendations = []
             
+            if features is None:
+                features = self.extract_features(document_content)
+            
             # Проверка технических терминов
-            technical_terms_found = self._count_technical_terms(document_content)
+            technical_terms_found = features.technical_term_count
             if technical_terms_found < self.config.min_technical_terms:
                 issues_found.append(f"Too few technical terms found: {technical_terms_found} (expected >= {self.config.min_technical_terms})")
                 recommendations.append("Check if technical terminology was properly preserved during processing")
             
             # Проверка блоков кода
-            code_blocks_found = len(re.findall(r'```[\s\S]*?```', document_content))
-            if code_blocks_found < self.config.min_code_blocks and 'command' in document_content.lower():
+            code_blocks_found = features.code_block_count
+            if code_blocks_found < self.config.min_code_blocks and features.mentions_command:
                 issues_found.append(f"Too few code blocks found: {code_blocks_found} (expected >= {self.config.min_code_blocks})")
                 recommendations.append("Technical commands should be wrapped in code blocks")
             
             # Проверка структуры markdown
-            if not re.search(r'^#{1,6}\s+.+$', document_content, re.MULTILINE):
+            if not features.has_headings:
                 issues_found.append("No markdown headings found")
                 recommendations.append("Document should have proper markdown heading structure")
             
@@ -94,7 +180,7 @@ class ContentValidator:
                 score -= 0.2 * len(issues_found)
             score = max(0.0, score)
             
-            processing_time = time.time() - start_time
+            processing_time = time.perf_counter() - start_time
             content_validation_duration.observe(processing_time)
             content_validation_requests.labels(status='success').inc()
             
@@ -112,14 +198,3 @@ class ContentValidator:
             content_validation_requests.labels(status='error').inc()
             logger.error(f"Content validation error: {e}")
             raise
-    
-    def _count_technical_terms(self, content: str) -> int:
-        """Подсчет технических терминов в документе"""
-        count = 0
-        content_lower = content.lower()
-        
-        for term in self.config.required_technical_terms:
-            if term.lower() in content_lower:
-                count += 1
-        
-        return count
\ No newline at end of file
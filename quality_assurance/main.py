@@ -10,17 +10,22 @@ import os
 import sys
 import asyncio
 import logging
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Tuple, Union
 from pathlib import Path
 import tempfile
-import json
+import shutil
 import time
+import hashlib
+import uuid
+from collections import OrderedDict
 from datetime import datetime
+from statistics import fmean
 import traceback
+from contextlib import asynccontextmanager
 
 # FastAPI импорты
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 import uvicorn
@@ -32,6 +37,7 @@ from pydantic_settings import BaseSettings
 # HTTP клиенты
 import httpx
 import aiofiles
+import orjson
 
 # Утилиты
 import structlog
@@ -43,8 +49,8 @@ import psutil
 from ocr_validator import OCRValidator, OCRValidationConfig
 from visual_diff_system import VisualDiffSystem, VisualDiffConfig
 from ast_comparator import ASTComparator, ASTComparisonConfig
-from auto_corrector import AutoCorrector, AutoCorrectorConfig
-from content_validator import ContentValidator, ContentValidationConfig
+from auto_corrector import AutoCorrector, AutoCorrectorConfig, close_vllm_clients
+from content_validator import ContentValidator, ContentValidationConfig, DocumentFeatures
 
 # =======================================================================================
 # КОНФИГУРАЦИЯ И НАСТРОЙКИ
@@ -67,6 +73,8 @@ class Settings(BaseSettings):
     vllm_base_url: str = "http://vllm-server:8000"
     vllm_api_key: str = "vllm-api-key"
     document_processor_url: str = "http://document-processor:8001"
+    # Кэш результатов автокоррекции (None — без кэша)
+    redis_url: Optional[str] = None
     
     # Пороги валидации
     ocr_confidence_threshold: float = 0.8
@@ -74,10 +82,20 @@ class Settings(BaseSettings):
     ast_similarity_threshold: float = 0.9
     overall_qa_threshold: float = 0.85
     
+    # PaddleOCR на CPU: число процессов инференса (0 — GPU/поток, см. OCRValidationConfig)
+    ocr_paddle_use_gpu: bool = True
+    ocr_paddle_cpu_workers: int = 0
+    
     # Настройки автокоррекции
     enable_auto_correction: bool = True
     max_corrections_per_document: int = 10
     
+    # Очистка временной директории (записи старше temp_retention_minutes)
+    temp_retention_minutes: int = 60
+    temp_cleanup_interval_seconds: int = 300
+    # Дисковый кэш OCR (cache_dir/ocr_results) чистится тем же фоновым заданием
+    ocr_cache_retention_hours: int = 168
+    
     class Config:
         env_file = ".env"
 
@@ -104,9 +122,31 @@ qa_full_validation_requests = Counter('qa_full_validation_total', 'Full QA valid
 qa_validation_duration = Histogram('qa_validation_duration_seconds', 'QA validation duration')
 qa_overall_score = Histogram('qa_overall_score', 'QA overall validation score')
 
+# Дочерние метрики с фиксированными метками создаются один раз
+QA_STARTED = qa_full_validation_requests.labels(status='started')
+QA_SUCCESS = qa_full_validation_requests.labels(status='success')
+QA_FAILED = qa_full_validation_requests.labels(status='failed')
+QA_ERROR = qa_full_validation_requests.labels(status='error')
+
+# HTTP метрики по (method, endpoint, status): набор меток ограничен маршрутами API
+_http_metric_children: Dict[Tuple[str, str, str], Tuple[Any, Any]] = {}
+
+def _http_metric_child(method: str, endpoint: str, status: str) -> Tuple[Any, Any]:
+    """Счетчик и гистограмма для набора меток (без labels() на каждый запрос)"""
+    key = (method, endpoint, status)
+    children = _http_metric_children.get(key)
+    if children is None:
+        children = (
+            http_requests.labels(method=method, endpoint=endpoint, status=status),
+            http_duration.labels(method=method, endpoint=endpoint)
+        )
+        _http_metric_children[key] = children
+    return children
+
 # Системные метрики
 memory_usage = Gauge('qa_memory_usage_bytes', 'Memory usage')
 disk_usage = Gauge('qa_disk_usage_percent', 'Disk usage percentage')
+temp_files = Gauge('qa_temp_files', 'Entries in the QA temp directory')
 
 # =======================================================================================
 # PYDANTIC МОДЕЛИ
@@ -119,7 +159,11 @@ class ValidationRequest(BaseModel):
     result_pdf_path: Optional[str] = None
     document_content: Optional[str] = None
     document_structure: Optional[Dict[str, Any]] = None
+    # Структура результирующего документа (если не передана — сравнивается document_structure сама с собой)
+    result_structure: Optional[Dict[str, Any]] = None
     enable_auto_correction: bool = True
+    # Запись JSON отчета на диск (без него ответ содержит все результаты)
+    write_report: bool = True
 
 class ValidationResponse(BaseModel):
     """Ответ на валидацию"""
@@ -163,47 +207,106 @@ ast_comparator: Optional[ASTComparator] = None
 content_validator: Optional[ContentValidator] = None
 auto_corrector: Optional[AutoCorrector] = None
 
+# OCR Validator и AST Comparator загружают модели: создаются при первом запросе
+_ocr_lock = asyncio.Lock()
+_ast_lock = asyncio.Lock()
+lazy_validators_status: Dict[str, str] = {
+    "ocr_validator": "not_loaded",
+    "ast_comparator": "not_loaded"
+}
+
+def _build_ocr_validator() -> OCRValidator:
+    """Создание OCR Validator вместе с моделью PaddleOCR (выполняется в потоке)"""
+    ocr_config = OCRValidationConfig(
+        consensus_threshold=settings.ocr_confidence_threshold,
+        paddle_use_gpu=settings.ocr_paddle_use_gpu,
+        paddle_cpu_workers=settings.ocr_paddle_cpu_workers,
+        temp_dir=settings.temp_dir,
+        cache_dir=settings.cache_dir
+    )
+    validator = OCRValidator(ocr_config)
+    try:
+        validator.preload_paddle()  # загрузка модели вне event loop
+    except Exception as e:
+        # Без PaddleOCR валидатор продолжит работу на остальных движках
+        logger.warning(f"PaddleOCR preload failed: {e}")
+    return validator
+
+def _build_ast_comparator() -> ASTComparator:
+    """Создание AST Comparator с семантической моделью (выполняется в потоке)"""
+    ast_config = ASTComparisonConfig(
+        similarity_threshold=settings.ast_similarity_threshold,
+        models_dir=f"{settings.models_dir}/shared/qa"
+    )
+    return ASTComparator(ast_config)
+
+async def get_ocr_validator() -> OCRValidator:
+    """OCR Validator (создается один раз, при первом вызове)"""
+    global ocr_validator
+    if ocr_validator is None:
+        async with _ocr_lock:
+            if ocr_validator is None:
+                lazy_validators_status["ocr_validator"] = "initializing"
+                try:
+                    ocr_validator = await asyncio.to_thread(_build_ocr_validator)
+                except Exception:
+                    lazy_validators_status["ocr_validator"] = "error"
+                    raise
+                lazy_validators_status["ocr_validator"] = "ready"
+    return ocr_validator
+
+async def get_ast_comparator() -> ASTComparator:
+    """AST Comparator (создается один раз, при первом вызове)"""
+    global ast_comparator
+    if ast_comparator is None:
+        async with _ast_lock:
+            if ast_comparator is None:
+                lazy_validators_status["ast_comparator"] = "initializing"
+                try:
+                    ast_comparator = await asyncio.to_thread(_build_ast_comparator)
+                except Exception:
+                    lazy_validators_status["ast_comparator"] = "error"
+                    raise
+                lazy_validators_status["ast_comparator"] = "ready"
+    return ast_comparator
+
+def _build_visual_diff_system() -> VisualDiffSystem:
+    """Создание Visual Diff System"""
+    visual_config = VisualDiffConfig(
+        ssim_threshold=settings.visual_similarity_threshold,
+        temp_dir=settings.temp_dir,
+        output_dir=settings.validation_reports_dir
+    )
+    return VisualDiffSystem(visual_config)
+
+def _build_content_validator() -> ContentValidator:
+    """Создание Content Validator"""
+    content_config = ContentValidationConfig()
+    return ContentValidator(content_config)
+
+def _build_auto_corrector() -> AutoCorrector:
+    """Создание Auto Corrector"""
+    corrector_config = AutoCorrectorConfig(
+        vllm_base_url=settings.vllm_base_url,
+        vllm_api_key=settings.vllm_api_key,
+        max_corrections_per_document=settings.max_corrections_per_document,
+        redis_url=settings.redis_url
+    )
+    return AutoCorrector(corrector_config)
+
 async def initialize_validators():
-    """Инициализация всех валидаторов"""
-    global ocr_validator, visual_diff_system, ast_comparator, content_validator, auto_corrector
+    """Инициализация валидаторов, не требующих моделей (OCR и AST — лениво, см. get_*)"""
+    global visual_diff_system, content_validator, auto_corrector
     
     logger.info("Initializing QA validators...")
     
     try:
-        # OCR Validator
-        ocr_config = OCRValidationConfig(
-            consensus_threshold=settings.ocr_confidence_threshold,
-            temp_dir=settings.temp_dir,
-            cache_dir=settings.cache_dir
-        )
-        ocr_validator = OCRValidator(ocr_config)
-        
-        # Visual Diff System
-        visual_config = VisualDiffConfig(
-            ssim_threshold=settings.visual_similarity_threshold,
-            temp_dir=settings.temp_dir,
-            output_dir=settings.validation_reports_dir
-        )
-        visual_diff_system = VisualDiffSystem(visual_config)
-        
-        # AST Comparator
-        ast_config = ASTComparisonConfig(
-            similarity_threshold=settings.ast_similarity_threshold,
-            models_dir=f"{settings.models_dir}/shared/qa"
+        # Конструкторы независимы: выполняем параллельно в потоках
+        visual_diff_system, content_validator, auto_corrector = await asyncio.gather(
+            asyncio.to_thread(_build_visual_diff_system),
+            asyncio.to_thread(_build_content_validator),
+            asyncio.to_thread(_build_auto_corrector)
         )
-        ast_comparator = ASTComparator(ast_config)
-        
-        # Content Validator
-        content_config = ContentValidationConfig()
-        content_validator = ContentValidator(content_config)
-        
-        # Auto Corrector
-        corrector_config = AutoCorrectorConfig(
-            vllm_base_url=settings.vllm_base_url,
-            vllm_api_key=settings.vllm_api_key,
-            max_corrections_per_document=settings.max_corrections_per_document
-        )
-        auto_corrector = AutoCorrector(corrector_config)
         
         logger.info("All QA validators initialized successfully")
         
@@ -211,20 +314,122 @@ async def initialize_validators():
         logger.error(f"Failed to initialize validators: {e}")
         raise
 
+# Системные метрики кэшируются: health check и скрейпинг не опрашивают psutil на каждый запрос
+SYSTEM_METRICS_TTL = 5.0
+_metrics_cache: Dict[str, Any] = {"ts": 0.0, "data": None}
+
+def _get_cached_system_metrics(ttl: float = SYSTEM_METRICS_TTL) -> Dict[str, Any]:
+    """Системные метрики (пересчитываются не чаще раза в ttl секунд)"""
+    now = time.monotonic()
+    if _metrics_cache["data"] is not None and now - _metrics_cache["ts"] < ttl:
+        return _metrics_cache["data"]
+    
+    memory = psutil.virtual_memory()
+    disk = psutil.disk_usage(settings.temp_dir)
+    with os.scandir(settings.temp_dir) as entries:
+        temp_files_count = sum(1 for _ in entries)
+    
+    data = {
+        "cpu_percent": psutil.cpu_percent(),
+        "memory_used": memory.used,
+        "memory_percent": memory.percent,
+        "memory_available_gb": round(memory.available / 1024**3, 2),
+        "disk_percent": disk.percent,
+        "disk_free_gb": round(disk.free / 1024**3, 2),
+        "temp_files_count": temp_files_count
+    }
+    
+    # Gauge обновляются вместе с кэшем
+    memory_usage.set(memory.used)
+    disk_usage.set(disk.percent)
+    temp_files.set(temp_files_count)
+    
+    _metrics_cache["ts"] = now
+    _metrics_cache["data"] = data
+    return data
+
+def _prune_dir(directory: str, max_age_seconds: float) -> int:
+    """Удаление записей директории старше max_age_seconds"""
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    if not os.path.isdir(directory):
+        return 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.unlink(entry.path)
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Failed to remove stale entry {entry.path}: {e}")
+    return removed
+
+async def prune_temp_dir_periodically():
+    """
+    Фоновая очистка временной директории (рабочие директории и отчеты не копятся)
+    и дискового кэша результатов OCR (без нее cache_dir/ocr_results растет бесконечно)
+    """
+    max_age_seconds = settings.temp_retention_minutes * 60
+    ocr_cache_dir = str(Path(settings.cache_dir) / "ocr_results")
+    ocr_cache_max_age_seconds = settings.ocr_cache_retention_hours * 3600
+    while True:
+        await asyncio.sleep(settings.temp_cleanup_interval_seconds)
+        try:
+            removed = await asyncio.to_thread(_prune_dir, settings.temp_dir, max_age_seconds)
+            if removed:
+                logger.info("Temp directory pruned", removed=removed)
+        except Exception as e:
+            logger.warning(f"Temp directory cleanup failed: {e}")
+        try:
+            removed = await asyncio.to_thread(_prune_dir, ocr_cache_dir, ocr_cache_max_age_seconds)
+            if removed:
+                logger.info("OCR result cache pruned", removed=removed)
+        except Exception as e:
+            logger.warning(f"OCR result cache cleanup failed: {e}")
+
 def update_system_metrics():
     """Обновление системных метрик"""
     try:
-        # Память
-        memory = psutil.virtual_memory()
-        memory_usage.set(memory.used)
-        
-        # Диск
-        disk = psutil.disk_usage('/app/temp')
-        disk_usage.set(disk.percent)
-        
+        _get_cached_system_metrics()
     except Exception as e:
         logger.warning(f"Failed to update system metrics: {e}")
 
+# =======================================================================================
+# STARTUP/SHUTDOWN
+# =======================================================================================
+
+startup_time = time.monotonic()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Инициализация при запуске и освобождение ресурсов при остановке"""
+    logger.info("Starting Quality Assurance API v4.0")
+    
+    # Создаем директории
+    Path(settings.temp_dir).mkdir(parents=True, exist_ok=True)
+    Path(settings.cache_dir).mkdir(parents=True, exist_ok=True)
+    Path(settings.validation_reports_dir).mkdir(parents=True, exist_ok=True)
+    
+    # Инициализируем валидаторы
+    await initialize_validators()
+    
+    # Запускаем Prometheus метрики
+    start_http_server(8003)
+    logger.info("Prometheus metrics server started on port 8003")
+    
+    cleanup_task = asyncio.create_task(prune_temp_dir_periodically())
+    
+    yield
+    
+    cleanup_task.cancel()
+    if ocr_validator is not None:
+        ocr_validator.close()
+    await close_vllm_clients()
+
 # =======================================================================================
 # FASTAPI APPLICATION
 # =======================================================================================
@@ -234,10 +439,49 @@ app = FastAPI(
     description="5-level document validation system with auto-correction",
     version="4.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    # Ответы (включая исправленный документ в /validate) сериализуются через orjson
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
-# Middleware
+class PrometheusASGIMiddleware:
+    """HTTP метрики (количество, длительность, активные запросы) без буферизации тела ответа"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        start_time = time.perf_counter()
+        active_requests.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            active_requests.dec()
+            # Неизвестные пути не размножают серии метрик
+            endpoint = scope["path"] if status_code != 404 else "not_found"
+            requests_counter, duration_histogram = _http_metric_child(scope["method"], endpoint, str(status_code))
+            requests_counter.inc()
+            duration_histogram.observe(time.perf_counter() - start_time)
+
+# Middleware (последний добавленный выполняется первым: CORS снаружи, сжатие внутри)
+app.add_middleware(PrometheusASGIMiddleware)
+
+# compresslevel=5: почти тот же размер JSON, что и при 9, при заметно меньшей нагрузке на CPU
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -246,30 +490,131 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.add_middleware(GZipMiddleware, minimum_size=1000)
-
 # =======================================================================================
-# STARTUP/SHUTDOWN EVENTS
+# УРОВНИ ВАЛИДАЦИИ
 # =======================================================================================
 
-startup_time = time.time()
+StageResult = Tuple[str, Dict[str, Any], List[str]]
 
-@app.on_event("startup")
-async def startup_event():
-    """Инициализация при запуске"""
-    logger.info("Starting Quality Assurance API v4.0")
-    
-    # Создаем директории
-    Path(settings.temp_dir).mkdir(parents=True, exist_ok=True)
-    Path(settings.cache_dir).mkdir(parents=True, exist_ok=True)
-    Path(settings.validation_reports_dir).mkdir(parents=True, exist_ok=True)
-    
-    # Инициализируем валидаторы
-    await initialize_validators()
-    
-    # Запускаем Prometheus метрики
-    start_http_server(8003)
-    logger.info("Prometheus metrics server started on port 8003")
+# Уровни, проблемы которых могут исправить генераторы коррекций AutoCorrector
+FIXABLE_LEVELS = ("content_validation", "ocr_validation", "ast_comparison")
+
+# Уровень валидации -> ключ скора, участвующего в общем скоре
+SCORE_KEYS = (
+    ("ocr_validation", "validation_score"),
+    ("visual_diff", "overall_similarity"),
+    ("ast_comparison", "overall_similarity"),
+    ("content_validation", "score"),
+)
+
+async def _run_ocr_validation(request: ValidationRequest) -> StageResult:
+    """Уровень 1: OCR Validation"""
+    try:
+        validator = await get_ocr_validator()
+        # Конвертируем первую страницу PDF в изображение для OCR валидации
+        ocr_result = await validator.validate_ocr_results(
+            request.original_pdf_path + "_page_1.png",  # Предполагаем, что изображение существует
+            request.document_content[:500] if request.document_content else None
+        )
+        return "ocr_validation", {
+            "consensus_confidence": ocr_result.consensus_confidence,
+            "validation_score": ocr_result.validation_score,
+            "issues_found": ocr_result.issues_found
+        }, ocr_result.recommendations
+    except Exception as e:
+        logger.warning(f"OCR validation failed: {e}")
+        return "ocr_validation", {"error": str(e)}, []
+
+async def _run_visual_diff(request: ValidationRequest, validation_id: str) -> StageResult:
+    """Уровень 2: Visual Diff"""
+    try:
+        visual_result = await visual_diff_system.compare_documents(
+            request.original_pdf_path,
+            request.result_pdf_path,
+            validation_id
+        )
+        return "visual_diff", {
+            "overall_similarity": visual_result.overall_similarity,
+            "ssim_score": visual_result.ssim_score,
+            "differences_count": len(visual_result.differences),
+            "summary": visual_result.summary
+        }, []
+    except Exception as e:
+        logger.warning(f"Visual diff failed: {e}")
+        return "visual_diff", {"error": str(e)}, []
+
+# Результаты AST сравнения по хэшу пары структур (повторные запросы тех же документов)
+AST_RESULTS_CACHE_SIZE = 256
+_ast_results_cache: "OrderedDict[str, Tuple[Dict[str, Any], List[str]]]" = OrderedDict()
+
+def _ast_pair_key(original_ast: Dict[str, Any], result_ast: Dict[str, Any]) -> str:
+    """Ключ кэша: хэш канонического JSON обеих структур"""
+    option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+    digest = hashlib.blake2b(orjson.dumps(original_ast, option=option), digest_size=16)
+    digest.update(b"\0")
+    digest.update(orjson.dumps(result_ast, option=option))
+    return digest.hexdigest()
+
+async def _run_ast_comparison(request: ValidationRequest, validation_id: str) -> StageResult:
+    """Уровень 3: AST Comparison"""
+    try:
+        original_ast = request.document_structure
+        result_ast = request.result_structure or request.document_structure
+        
+        # Одинаковые структуры: сходство заведомо полное, модель не нужна
+        if original_ast is result_ast or original_ast == result_ast:
+            return "ast_comparison", {
+                "overall_similarity": 1.0,
+                "structural_similarity": 1.0,
+                "semantic_similarity": 1.0,
+                "issues_found": []
+            }, []
+        
+        cache_key = _ast_pair_key(original_ast, result_ast)
+        cached = _ast_results_cache.get(cache_key)
+        if cached is not None:
+            _ast_results_cache.move_to_end(cache_key)
+            return "ast_comparison", dict(cached[0]), list(cached[1])
+        
+        comparator = await get_ast_comparator()
+        ast_result = await comparator.compare_ast_structures(
+            original_ast, result_ast, validation_id
+        )
+        stage_result = {
+            "overall_similarity": ast_result.overall_similarity,
+            "structural_similarity": ast_result.structural_similarity,
+            "semantic_similarity": ast_result.semantic_similarity,
+            "issues_found": ast_result.issues_found
+        }
+        
+        _ast_results_cache[cache_key] = (stage_result, ast_result.recommendations)
+        if len(_ast_results_cache) > AST_RESULTS_CACHE_SIZE:
+            _ast_results_cache.popitem(last=False)
+        
+        return "ast_comparison", dict(stage_result), list(ast_result.recommendations)
+    except Exception as e:
+        logger.warning(f"AST comparison failed: {e}")
+        return "ast_comparison", {"error": str(e)}, []
+
+async def _run_content_validation(
+    request: ValidationRequest,
+    document_features: Optional[DocumentFeatures]
+) -> StageResult:
+    """Уровень 4: Content Validation"""
+    try:
+        content_result = await content_validator.validate_content(
+            request.document_content, features=document_features
+        )
+        return "content_validation", {
+            "passed": content_result.passed,
+            "score": content_result.score,
+            "issues_found": content_result.issues_found,
+            "technical_terms_found": content_result.technical_terms_found,
+            "code_blocks_found": content_result.code_blocks_found
+        }, content_result.recommendations
+    except Exception as e:
+        logger.warning(f"Content validation failed: {e}")
+        return "content_validation", {"error": str(e)}, []
 
 # =======================================================================================
 # API ENDPOINTS
@@ -278,28 +623,25 @@ async def startup_event():
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
-    update_system_metrics()
+    system_metrics = _get_cached_system_metrics()
     
     # Проверяем статус валидаторов
     validators_status = {
-        "ocr_validator": "healthy" if ocr_validator else "unavailable",
+        "ocr_validator": lazy_validators_status["ocr_validator"],
         "visual_diff_system": "healthy" if visual_diff_system else "unavailable",
-        "ast_comparator": "healthy" if ast_comparator else "unavailable",
+        "ast_comparator": lazy_validators_status["ast_comparator"],
         "content_validator": "healthy" if content_validator else "unavailable",
         "auto_corrector": "healthy" if auto_corrector else "unavailable"
     }
     
-    # Системная информация
-    memory = psutil.virtual_memory()
-    disk = psutil.disk_usage('/app/temp')
-    
+    # Системная информация (из кэша)
     system_info = {
-        "cpu_percent": psutil.cpu_percent(),
-        "memory_percent": memory.percent,
-        "memory_available_gb": round(memory.available / 1024**3, 2),
-        "disk_free_gb": round(disk.free / 1024**3, 2),
-        "temp_files_count": len(list(Path(settings.temp_dir).glob("*"))),
-        "uptime_seconds": int(time.time() - startup_time)
+        "cpu_percent": system_metrics["cpu_percent"],
+        "memory_percent": system_metrics["memory_percent"],
+        "memory_available_gb": system_metrics["memory_available_gb"],
+        "disk_free_gb": system_metrics["disk_free_gb"],
+        "temp_files_count": system_metrics["temp_files_count"],
+        "uptime_seconds": int(time.monotonic() - startup_time)
     }
     
     return HealthResponse(
@@ -314,149 +656,102 @@ async def validate_document(request: ValidationRequest):
     """
     Полная валидация документа через все 5 уровней QA системы
     """
-    start_time = time.time()
-    active_requests.inc()
-    validation_id = f"qa_{int(start_time)}"
+    start_time = time.monotonic()
+    validation_id = f"qa_{uuid.uuid4().hex[:16]}"
     
     try:
-        qa_full_validation_requests.labels(status='started').inc()
-        http_requests.labels(method="POST", endpoint="/validate", status="started").inc()
+        QA_STARTED.inc()
         
         logger.info(f"Starting full validation: {validation_id}")
         
-        # Создаем рабочую директорию
+        # Рабочая директория (создается при записи отчета)
         work_dir = Path(settings.temp_dir) / validation_id
-        work_dir.mkdir(parents=True, exist_ok=True)
         
         validation_results = {}
         recommendations = []
         
-        # Уровень 1: OCR Validation
-        if request.original_pdf_path and ocr_validator:
-            try:
-                # Конвертируем первую страницу PDF в изображение для OCR валидации
-                ocr_result = await ocr_validator.validate_ocr_results(
-                    request.original_pdf_path + "_page_1.png",  # Предполагаем, что изображение существует
-                    request.document_content[:500] if request.document_content else None
-                )
-                validation_results["ocr_validation"] = {
-                    "consensus_confidence": ocr_result.consensus_confidence,
-                    "validation_score": ocr_result.validation_score,
-                    "issues_found": ocr_result.issues_found
-                }
-                recommendations.extend(ocr_result.recommendations)
-            except Exception as e:
-                logger.warning(f"OCR validation failed: {e}")
-                validation_results["ocr_validation"] = {"error": str(e)}
-        
-        # Уровень 2: Visual Diff
+        # Уровни 1-4 независимы друг от друга: запускаем параллельно
+        # Признаки документа извлекаются один раз и передаются в валидатор и автокоррекцию
+        document_features = None
+        if request.document_content and content_validator:
+            document_features = content_validator.extract_features(request.document_content)
+        
+        stages = []
+        if request.original_pdf_path:
+            stages.append(_run_ocr_validation(request))
         if request.original_pdf_path and request.result_pdf_path and visual_diff_system:
-            try:
-                visual_result = await visual_diff_system.compare_documents(
-                    request.original_pdf_path,
-                    request.result_pdf_path,
-                    validation_id
-                )
-                validation_results["visual_diff"] = {
-                    "overall_similarity": visual_result.overall_similarity,
-                    "ssim_score": visual_result.ssim_score,
-                    "differences_count": len(visual_result.differences),
-                    "summary": visual_result.summary
-                }
-            except Exception as e:
-                logger.warning(f"Visual diff failed: {e}")
-                validation_results["visual_diff"] = {"error": str(e)}
-        
-        # Уровень 3: AST Comparison
-        if request.document_structure and ast_comparator:
-            try:
-                # Для демонстрации используем ту же структуру как оригинал
-                original_ast = request.document_structure
-                result_ast = request.document_structure  # В реальности это будет из результирующего документа
-                
-                ast_result = await ast_comparator.compare_ast_structures(
-                    original_ast, result_ast, validation_id
-                )
-                validation_results["ast_comparison"] = {
-                    "overall_similarity": ast_result.overall_similarity,
-                    "structural_similarity": ast_result.structural_similarity,
-                    "semantic_similarity": ast_result.semantic_similarity,
-                    "issues_found": ast_result.issues_found
-                }
-                recommendations.extend(ast_result.recommendations)
-            except Exception as e:
-                logger.warning(f"AST comparison failed: {e}")
-                validation_results["ast_comparison"] = {"error": str(e)}
-        
-        # Уровень 4: Content Validation
+            stages.append(_run_visual_diff(request, validation_id))
+        if request.document_structure:
+            stages.append(_run_ast_comparison(request, validation_id))
         if request.document_content and content_validator:
-            try:
-                content_result = await content_validator.validate_content(request.document_content)
-                validation_results["content_validation"] = {
-                    "passed": content_result.passed,
-                    "score": content_result.score,
-                    "issues_found": content_result.issues_found,
-                    "technical_terms_found": content_result.technical_terms_found,
-                    "code_blocks_found": content_result.code_blocks_found
-                }
-                recommendations.extend(content_result.recommendations)
-            except Exception as e:
-                logger.warning(f"Content validation failed: {e}")
-                validation_results["content_validation"] = {"error": str(e)}
-        
-        # Расчет общего скора
-        scores = []
-        if "ocr_validation" in validation_results and "validation_score" in validation_results["ocr_validation"]:
-            scores.append(validation_results["ocr_validation"]["validation_score"])
-        if "visual_diff" in validation_results and "overall_similarity" in validation_results["visual_diff"]:
-            scores.append(validation_results["visual_diff"]["overall_similarity"])
-        if "ast_comparison" in validation_results and "overall_similarity" in validation_results["ast_comparison"]:
-            scores.append(validation_results["ast_comparison"]["overall_similarity"])
-        if "content_validation" in validation_results and "score" in validation_results["content_validation"]:
-            scores.append(validation_results["content_validation"]["score"])
-        
-        overall_score = sum(scores) / len(scores) if scores else 0.0
+            stages.append(_run_content_validation(request, document_features))
+        
+        for key, stage_result, stage_recommendations in await asyncio.gather(*stages):
+            validation_results[key] = stage_result
+            recommendations.extend(stage_recommendations)
+        
+        # Расчет общего скора (уровни с ошибкой не содержат ключа скора)
+        scores = [
+            score for level, score_key in SCORE_KEYS
+            if (score := validation_results.get(level, {}).get(score_key)) is not None
+        ]
+        
+        overall_score = fmean(scores) if scores else 0.0
         passed = overall_score >= settings.overall_qa_threshold
         
         # Уровень 5: Auto Correction (если включена и есть проблемы)
         corrected_document = None
         auto_correction_result = None
         
+        # vLLM исправляет только текстовые проблемы: без них (например, при расхождениях
+        # только в visual diff) автокоррекция не запускается
+        fixable = any(
+            validation_results.get(level, {}).get("issues_found")
+            for level in FIXABLE_LEVELS
+        )
+        
         if (request.enable_auto_correction and settings.enable_auto_correction and 
             not passed and request.document_content and auto_corrector):
-            try:
-                async with auto_corrector as corrector:
-                    correction_result = await corrector.apply_corrections(
-                        request.document_content, validation_results, validation_id
-                    )
+            if not fixable:
+                logger.info(
+                    f"Auto correction skipped: {validation_id}",
+                    reason="no text issues to fix"
+                )
+            else:
+                try:
+                    async with auto_corrector as corrector:
+                        correction_result = await corrector.apply_corrections(
+                            request.document_content, validation_results, validation_id,
+                            features=document_features
+                        )
                     
-                    auto_correction_result = {
-                        "total_corrections": correction_result.total_corrections,
-                        "successful_corrections": correction_result.successful_corrections,
-                        "failed_corrections": correction_result.failed_corrections,
-                        "processing_time": correction_result.processing_time
-                    }
+                        auto_correction_result = {
+                            "total_corrections": correction_result.total_corrections,
+                            "successful_corrections": correction_result.successful_corrections,
+                            "failed_corrections": correction_result.failed_corrections,
+                            "processing_time": correction_result.processing_time
+                        }
                     
-                    if correction_result.corrected_document:
-                        corrected_document = correction_result.corrected_document
+                        if correction_result.corrected_document:
+                            corrected_document = correction_result.corrected_document
                         
-            except Exception as e:
-                logger.warning(f"Auto correction failed: {e}")
-                auto_correction_result = {"error": str(e)}
+                except Exception as e:
+                    logger.warning(f"Auto correction failed: {e}")
+                    auto_correction_result = {"error": str(e)}
         
-        # Создание отчета валидации
-        report_path = await create_validation_report(
-            validation_id, validation_results, overall_score, recommendations, work_dir
-        )
+        # Создание отчета валидации (если запрошен)
+        report_path = None
+        if request.write_report:
+            report_path = await create_validation_report(
+                validation_id, validation_results, overall_score, recommendations, work_dir
+            )
         
         # Обновляем метрики
-        processing_time = time.time() - start_time
+        processing_time = time.monotonic() - start_time
         qa_validation_duration.observe(processing_time)
         qa_overall_score.observe(overall_score)
         
-        status = 'success' if passed else 'failed'
-        qa_full_validation_requests.labels(status=status).inc()
-        http_requests.labels(method="POST", endpoint="/validate", status=status).inc()
+        (QA_SUCCESS if passed else QA_FAILED).inc()
         
         response = ValidationResponse(
             success=True,
@@ -487,17 +782,13 @@ async def validate_document(request: ValidationRequest):
     except HTTPException:
         raise
     except Exception as e:
-        qa_full_validation_requests.labels(status='error').inc()
-        http_requests.labels(method="POST", endpoint="/validate", status="error").inc()
+        QA_ERROR.inc()
         logger.error(f"Error in validation {validation_id}: {e}\n{traceback.format_exc()}")
         
         raise HTTPException(
             status_code=500,
             detail=f"Validation failed: {str(e)}"
         )
-        
-    finally:
-        active_requests.dec()
 
 async def create_validation_report(
     validation_id: str,
@@ -509,6 +800,8 @@ async def create_validation_report(
     """Создание отчета валидации"""
     try:
         report_path = work_dir / f"{validation_id}_validation_report.json"
+        # Директория создается только перед записью отчета и вне event loop
+        await asyncio.to_thread(os.makedirs, work_dir, exist_ok=True)
         
         report = {
             "validation_id": validation_id,
@@ -525,8 +818,14 @@ async def create_validation_report(
             }
         }
         
-        with open(report_path, 'w', encoding='utf-8') as f:
-            json.dump(report, f, ensure_ascii=False, indent=2)
+        # orjson пишет UTF-8 без экранирования и сериализует numpy значения из результатов
+        payload = orjson.dumps(
+            report,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+        # Запись файла не блокирует event loop
+        async with aiofiles.open(report_path, 'wb') as f:
+            await f.write(payload)
         
         return report_path
         
@@ -538,6 +837,7 @@ async def create_validation_report(
 async def get_metrics():
     """Prometheus метрики endpoint"""
     from fastapi.responses import Response
+    update_system_metrics()
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/status")
@@ -546,11 +846,11 @@ async def get_status():
     return {
         "service": "quality-assurance",
         "version": "4.0.0",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": datetime.now(),
         "validators": {
-            "ocr_validator": bool(ocr_validator),
+            "ocr_validator": lazy_validators_status["ocr_validator"],
             "visual_diff_system": bool(visual_diff_system),
-            "ast_comparator": bool(ast_comparator),
+            "ast_comparator": lazy_validators_status["ast_comparator"],
             "content_validator": bool(content_validator),
             "auto_corrector": bool(auto_corrector)
         },
@@ -573,6 +873,11 @@ if __name__ == "__main__":
         host=settings.host,
         port=settings.port,
         log_level="info" if not settings.debug else "debug",
-        access_log=True,
-        reload=settings.debug
+        # Access log — запись в stdout под блокировкой на каждый запрос: только в debug
+        access_log=settings.debug,
+        reload=settings.debug,
+        # Цикл событий на libuv и HTTP парсер на llhttp; без них uvicorn молча
+        # откатился бы на asyncio и h11
+        loop="uvloop",
+        http="httptools"
     )
\ No newline at end of file
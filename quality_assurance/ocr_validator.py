@@ -10,30 +10,35 @@ import os
 import sys
 import asyncio
 import logging
-from typing import Dict, List, Optional, Any, Tuple, Union
+from typing import Awaitable, Callable, Dict, List, Optional, Any, Tuple, Union
 from pathlib import Path
 import tempfile
 import json
-from dataclasses import dataclass
-from datetime import datetime
-import difflib
-import statistics
-
-# OCR движки
-import pytesseract
-from paddleocr import PaddleOCR
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+import time
+import functools
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import shlex
+import shutil
 
 # Обработка изображений
-import cv2
+import imagesize
 import numpy as np
-from PIL import Image
 
-# Текстовый анализ
-import jieba
-from textdistance import levenshtein, jaccard
-from langdetect import detect
+# Сравнение текстов (C++ реализация Levenshtein/Indel)
+from rapidfuzz import process
+from rapidfuzz.distance import Indel, Levenshtein
+
+# OCR движки (PaddleOCR), cv2, jieba и fasttext
+# импортируются при первом использовании: импорт paddleocr занимает секунды,
+# а сервис может вообще не получать запросов на OCR валидацию
 
 # Утилиты
+import orjson
 import structlog
 from prometheus_client import Counter, Histogram, Gauge
 
@@ -49,6 +54,9 @@ ocr_validation_duration = Histogram('ocr_validation_duration_seconds', 'OCR vali
 ocr_consensus_score = Histogram('ocr_consensus_score', 'OCR consensus confidence score')
 ocr_engines_used = Counter('ocr_engines_used_total', 'OCR engines usage', ['engine'])
 
+# Общий лимит одновременных запусков OCR движков (все запросы процесса)
+_OCR_SEMAPHORE = asyncio.Semaphore(int(os.getenv('OCR_CONCURRENCY', os.cpu_count() or 1)))
+
 @dataclass
 class OCRValidationConfig:
     """Конфигурация OCR валидации"""
@@ -61,8 +69,16 @@ class OCRValidationConfig:
     paddle_use_gpu: bool = True
     paddle_lang: str = "ch"
     paddle_use_angle_cls: bool = True
+    # Конвейер PaddleOCR: единственный воркер инференса забирает уже ожидающие страницы
+    # всех запросов (до paddle_batch_size за один переход в поток), не выжидая новых
+    paddle_batch_size: int = 8
+    paddle_queue_size: int = 32
+    # Инференс на CPU в пуле процессов (у каждого свой PaddleOCR, без GIL основного
+    # процесса); 0 — конвейер в потоке. Используется только при paddle_use_gpu=False
+    paddle_cpu_workers: int = 0
     
-    # Tesseract настройки
+    # Tesseract настройки (вызывается напрямую как подпроцесс)
+    tesseract_cmd: str = "tesseract"
     tesseract_config: str = "--oem 3 --psm 6"
     tesseract_lang: str = "chi_sim+eng+rus"
     
@@ -71,10 +87,64 @@ class OCRValidationConfig:
     similarity_threshold: float = 0.8
     chinese_mode: bool = True
     
+    # Определение языка (fasttext lid.176, 2-буквенные коды ISO 639-1)
+    lid_model_path: str = "/app/models/lid.176.ftz"
+    
+    # Кэш результатов OCR по содержимому изображения (память + cache_dir/ocr_results;
+    # дисковые записи без обращений дольше ocr_cache_retention_hours удаляет main.py)
+    enable_result_cache: bool = True
+    memory_cache_size: int = 1024
+    
     # Директории
     temp_dir: str = "/app/temp"
     cache_dir: str = "/app/cache"
 
+PADDLE_WARMUP_SIZE = 640
+LID_MAX_CHARS = 512
+TSV_CONF_COLUMN = 10
+
+@functools.lru_cache(maxsize=1)
+def _get_paddle_ocr(use_angle_cls: bool, lang: str, use_gpu: bool):
+    """PaddleOCR создается один раз, при первом запросе"""
+    from paddleocr import PaddleOCR
+    
+    paddle_ocr = PaddleOCR(
+        use_angle_cls=use_angle_cls,
+        lang=lang,
+        use_gpu=use_gpu,
+        show_log=False
+    )
+    
+    # Прогрев: первые вызовы инициализируют ядра и память предиктора,
+    # без прогрева первая пачка страниц платит эту цену
+    try:
+        paddle_ocr.ocr(np.zeros((PADDLE_WARMUP_SIZE, PADDLE_WARMUP_SIZE, 3), dtype=np.uint8), cls=use_angle_cls)
+    except Exception as e:
+        logger.warning(f"PaddleOCR warmup failed: {e}")
+    
+    logger.info("PaddleOCR initialized")
+    return paddle_ocr
+
+def _paddle_process_init(use_angle_cls: bool, lang: str):
+    """Инициализатор процесса пула: модель PaddleOCR (CPU) создается и прогревается заранее"""
+    _get_paddle_ocr(use_angle_cls, lang, False)
+
+def _paddle_process_ready():
+    """Пустая задача пула: процесс запущен и его инициализатор отработал"""
+
+def _paddle_process_ocr(image_bytes: bytes, use_angle_cls: bool, lang: str) -> Any:
+    """Распознавание страницы в процессе пула (сырой результат PaddleOCR)"""
+    return _get_paddle_ocr(use_angle_cls, lang, False).ocr(_decode_image(image_bytes), cls=True)
+
+@functools.lru_cache(maxsize=1)
+def _get_lid_model(model_path: str):
+    """Модель fasttext lid.176 (~1 МБ) загружается один раз, при первом запросе"""
+    import fasttext
+    
+    model = fasttext.load_model(model_path)
+    logger.info("fasttext language ID model loaded", model_path=model_path)
+    return model
+
 # =======================================================================================
 # КЛАССЫ ДАННЫХ
 # =======================================================================================
@@ -88,12 +158,23 @@ class OCRResult:
     processing_time: float
     word_count: int
     language: str
-    bbox_info: Optional[List[Dict]] = None
+    # Строки распознанного текста (SoA): параллельные массивы вместо списка словарей
+    bboxes: Optional[np.ndarray] = None  # (N, 4, 2) float32
+    confidences: Optional[np.ndarray] = None  # (N,) float32
+    texts: Optional[List[str]] = None
     metadata: Dict[str, Any] = None
+    has_cjk: Optional[bool] = None
     
     def __post_init__(self):
         if self.metadata is None:
             self.metadata = {}
+        if self.has_cjk is None:
+            self.has_cjk = _has_cjk(self.text)
+        # Из дискового кэша массивы приходят списками
+        if self.bboxes is not None:
+            self.bboxes = np.asarray(self.bboxes, dtype=np.float32).reshape(-1, 4, 2)
+        if self.confidences is not None:
+            self.confidences = np.asarray(self.confidences, dtype=np.float32)
 
 @dataclass
 class ValidationResult:
@@ -111,6 +192,128 @@ class ValidationResult:
         if self.metadata is None:
             self.metadata = {}
 
+def _has_cjk(text: str) -> bool:
+    """Есть ли в тексте иероглифы CJK (U+4E00..U+9FFF): одна векторная проверка по кодпоинтам"""
+    codepoints = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    return bool(((codepoints >= 0x4e00) & (codepoints <= 0x9fff)).any())
+
+def _set_similarity_matrix(token_sets: List[set]) -> np.ndarray:
+    """Матрица коэффициентов Жаккара: считается только верхний треугольник, затем отражается"""
+    n = len(token_sets)
+    matrix = np.eye(n)
+    for i, j in zip(*np.triu_indices(n, k=1)):
+        a, b = token_sets[i], token_sets[j]
+        union = len(a | b)
+        matrix[i, j] = matrix[j, i] = len(a & b) / union if union else 0.0
+    # Пустое множество не похоже даже само на себя (как и в попарной формуле)
+    matrix[np.diag_indices(n)] = [1.0 if tokens else 0.0 for tokens in token_sets]
+    return matrix
+
+def _validate_image_header(image_path: str) -> Tuple[int, int]:
+    """Размеры изображения по заголовку файла (без чтения и декодирования всего файла)"""
+    width, height = imagesize.get(image_path)
+    # -1 — формат не распознан imagesize: решение остается за декодером
+    if width == 0 or height == 0:
+        raise ValueError(f"Broken image header ({width}x{height}): {image_path}")
+    return width, height
+
+def _bytes_md5(data: bytes) -> str:
+    """md5 содержимого изображения (единицы мс против сотен мс на OCR)"""
+    return hashlib.md5(data).hexdigest()
+
+def _load_cached_result(cache_path: Path) -> Optional[OCRResult]:
+    """Чтение результата OCR из дискового кэша"""
+    try:
+        result = OCRResult(**orjson.loads(cache_path.read_bytes()))
+        # Обновляем mtime: очистка кэша в main.py удаляет записи по возрасту
+        os.utime(cache_path)
+        return result
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring corrupted OCR cache entry {cache_path}: {e}")
+        return None
+
+def _store_cached_result(cache_path: Path, result: OCRResult):
+    """Запись результата OCR в дисковый кэш (через временный файл и атомарный rename)"""
+    try:
+        tmp_path = cache_path.with_suffix(f".json.{os.getpid()}.tmp")
+        tmp_path.write_bytes(orjson.dumps(asdict(result), option=orjson.OPT_SERIALIZE_NUMPY))
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        logger.warning(f"Failed to store OCR cache entry {cache_path}: {e}")
+
+def _decode_image(image_bytes: bytes) -> np.ndarray:
+    """Декодирование уже прочитанного файла изображения OpenCV (без повторного чтения с диска)"""
+    import cv2
+    
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise Exception("Cannot decode image")
+    return image
+
+class PaddleOCRPipeline:
+    """
+    Конвейер PaddleOCR: декодирование изображений в потоках -> единственный воркер
+    инференса (страницы всех запросов по очереди) -> постобработка у вызывающего.
+    PaddleOCR распознает по одному изображению, поэтому инференс не батчится: воркер
+    лишь забирает уже ожидающие страницы за один переход в поток, без окна ожидания.
+    Очередь ограничена: при перегрузке GPU запросы ждут на put, а не копят изображения
+    """
+    
+    def __init__(self, get_engine: Callable[[], Any], batch_size: int = 8, queue_size: int = 32):
+        self.loop = asyncio.get_running_loop()
+        self._get_engine = get_engine
+        self.batch_size = batch_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._worker = self.loop.create_task(self._paddle_worker())
+    
+    async def submit(self, image_bytes: bytes) -> Any:
+        """Распознавание одной страницы (сырой результат PaddleOCR)"""
+        image = await asyncio.to_thread(_decode_image, image_bytes)
+        future = self.loop.create_future()
+        await self._queue.put((image, future))
+        return await future
+    
+    def close(self):
+        """Остановка воркера; ожидающие запросы отменяются"""
+        self._worker.cancel()
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+    
+    async def _paddle_worker(self):
+        """Страница отправляется в инференс сразу; уже ожидающие (до batch_size) — вместе с ней"""
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            try:
+                async with _OCR_SEMAPHORE:
+                    results = await asyncio.to_thread(self._ocr_batch, [image for image, _ in batch])
+            except asyncio.CancelledError:
+                # close(): страницы уже взятой пачки отсутствуют в очереди, отменяем их здесь
+                for _, future in batch:
+                    if not future.done():
+                        future.cancel()
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+    
+    def _ocr_batch(self, images: List[np.ndarray]) -> List[Any]:
+        """Последовательный инференс страниц в одном потоке (предиктор используется только воркером)"""
+        engine = self._get_engine()
+        return [engine.ocr(image, cls=True) for image in images]
+
 # =======================================================================================
 # OCR VALIDATOR КЛАСС
 # =======================================================================================
@@ -121,29 +324,59 @@ class OCRValidator:
     def __init__(self, config: Optional[OCRValidationConfig] = None):
         self.config = config or OCRValidationConfig()
         self.logger = structlog.get_logger("ocr_validator")
+        self._paddle_pipeline: Optional[PaddleOCRPipeline] = None
+        self._paddle_pool: Optional[ProcessPoolExecutor] = None
+        if not self.config.paddle_use_gpu and self.config.paddle_cpu_workers > 0:
+            # spawn: дочерние процессы не наследуют потоки и состояние event loop
+            self._paddle_pool = ProcessPoolExecutor(
+                max_workers=self.config.paddle_cpu_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_paddle_process_init,
+                initargs=(self.config.paddle_use_angle_cls, self.config.paddle_lang)
+            )
+        self._results_cache: "OrderedDict[str, OCRResult]" = OrderedDict()
+        self._results_cache_dir = Path(self.config.cache_dir) / "ocr_results"
         
         # Инициализируем OCR движки
         self._initialize_engines()
         
+        # Словарь jieba загружается сразу, а не при первом сравнении текстов
+        if self.config.chinese_mode:
+            self._initialize_jieba()
+        
         # Создаем директории
         Path(self.config.temp_dir).mkdir(parents=True, exist_ok=True)
         Path(self.config.cache_dir).mkdir(parents=True, exist_ok=True)
+        if self.config.enable_result_cache:
+            self._results_cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    @property
+    def paddle_ocr(self):
+        """PaddleOCR (модель загружается при первом обращении)"""
+        return _get_paddle_ocr(
+            self.config.paddle_use_angle_cls,
+            self.config.paddle_lang,
+            self.config.paddle_use_gpu
+        )
+    
+    def preload_paddle(self):
+        """Загрузка модели PaddleOCR заранее (в пуле — запуск процессов с их моделями)"""
+        if self._paddle_pool is None:
+            self.paddle_ocr
+            return
+        # Модель строит и прогревает инициализатор каждого процесса; задачи-пустышки
+        # (ничего не возвращают) лишь запускают процессы пула и ждут их инициализации
+        futures = [self._paddle_pool.submit(_paddle_process_ready) for _ in range(self.config.paddle_cpu_workers)]
+        for future in futures:
+            future.result()
     
     def _initialize_engines(self):
-        """Инициализация OCR движков"""
+        """Инициализация OCR движков (PaddleOCR — лениво, см. paddle_ocr)"""
         try:
-            # PaddleOCR
-            self.paddle_ocr = PaddleOCR(
-                use_angle_cls=self.config.paddle_use_angle_cls,
-                lang=self.config.paddle_lang,
-                use_gpu=self.config.paddle_use_gpu,
-                show_log=False
-            )
-            self.logger.info("PaddleOCR initialized")
-            
             # Tesseract (проверяем доступность)
             try:
-                pytesseract.get_tesseract_version()
+                if shutil.which(self.config.tesseract_cmd) is None:
+                    raise FileNotFoundError(f"{self.config.tesseract_cmd} not found in PATH")
                 self.tesseract_available = True
                 self.logger.info("Tesseract OCR available")
             except Exception as e:
@@ -154,6 +387,15 @@ class OCRValidator:
             self.logger.error(f"Error initializing OCR engines: {e}")
             raise
     
+    def _initialize_jieba(self):
+        """Загрузка словаря jieba (иначе ~1 с при первом jieba.cut)"""
+        try:
+            import jieba
+            jieba.setLogLevel(logging.WARNING)
+            jieba.initialize()
+        except Exception as e:
+            self.logger.warning(f"jieba initialization failed: {e}")
+    
     async def validate_ocr_results(
         self, 
         image_path: str,
@@ -171,7 +413,7 @@ class OCRValidator:
         Returns:
             ValidationResult: Результат валидации
         """
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         
         try:
             ocr_validation_requests.labels(status='started').inc()
@@ -180,21 +422,32 @@ class OCRValidator:
             if not Path(image_path).exists():
                 raise FileNotFoundError(f"Image file not found: {image_path}")
             
-            # Получаем результаты от разных движков
+            # Получаем результаты от разных движков параллельно
+            # (Tesseract на CPU в потоке, пока PaddleOCR работает на GPU)
             ocr_results = []
             
-            # PaddleOCR результат
-            paddle_result = await self._run_paddle_ocr(image_path)
-            if paddle_result:
-                ocr_results.append(paddle_result)
-                ocr_engines_used.labels(engine='paddleocr').inc()
+            # Битый заголовок отсекаем до чтения и декодирования всего файла
+            await asyncio.to_thread(_validate_image_header, image_path)
             
-            # Tesseract результат
+            # Файл читается один раз: байты идут и в хэш кэша, и в оба движка
+            image_bytes = await asyncio.to_thread(Path(image_path).read_bytes)
+            
+            image_hash = None
+            if self.config.enable_result_cache:
+                image_hash = await asyncio.to_thread(_bytes_md5, image_bytes)
+            
+            engine_runs = [self._run_engine_cached("paddleocr", self._run_paddle_ocr, image_bytes, image_hash)]
             if self.tesseract_available:
-                tesseract_result = await self._run_tesseract_ocr(image_path)
-                if tesseract_result:
-                    ocr_results.append(tesseract_result)
-                    ocr_engines_used.labels(engine='tesseract').inc()
+                engine_runs.append(
+                    self._run_engine_cached("tesseract", self._run_tesseract_ocr, image_bytes, image_hash)
+                )
+            
+            for engine_result in await asyncio.gather(*engine_runs, return_exceptions=True):
+                if isinstance(engine_result, Exception):
+                    self.logger.warning(f"OCR engine failed: {engine_result}")
+                elif engine_result:
+                    ocr_results.append(engine_result)
+                    ocr_engines_used.labels(engine=engine_result.engine).inc()
             
             # Добавляем reference OCR если предоставлен
             if reference_ocr:
@@ -216,7 +469,7 @@ class OCRValidator:
             validation_result = await self._build_consensus(ocr_results, expected_language)
             
             # Обновляем метрики
-            processing_time = (datetime.now() - start_time).total_seconds()
+            processing_time = time.perf_counter() - start_time
             validation_result.processing_time = processing_time
             
             ocr_validation_duration.observe(processing_time)
@@ -237,52 +490,153 @@ class OCRValidator:
             self.logger.error(f"OCR validation error: {e}")
             raise
     
-    async def _run_paddle_ocr(self, image_path: str) -> Optional[OCRResult]:
-        """Запуск PaddleOCR"""
-        try:
-            start_time = datetime.now()
-            
-            # Загружаем изображение
-            image = cv2.imread(image_path)
-            if image is None:
-                raise Exception(f"Cannot load image: {image_path}")
-            
-            # Запускаем OCR
-            results = self.paddle_ocr.ocr(image, cls=True)
+    async def validate_ocr_pages(
+        self,
+        image_paths: List[str],
+        reference_ocr: Optional[List[Optional[str]]] = None,
+        expected_language: str = "zh-CN"
+    ) -> List[ValidationResult]:
+        """
+        Валидация нескольких страниц: все страницы отправляются одновременно,
+        поэтому воркер PaddleOCR обрабатывает их общими пачками
+        
+        Args:
+            image_paths: Пути к изображениям страниц
+            reference_ocr: Эталонный OCR по страницам (того же размера, что image_paths)
+            expected_language: Ожидаемый язык документа
             
+        Returns:
+            List[ValidationResult]: Результаты в порядке страниц
+        """
+        references = reference_ocr or [None] * len(image_paths)
+        return await asyncio.gather(*(
+            self.validate_ocr_results(image_path, reference, expected_language)
+            for image_path, reference in zip(image_paths, references)
+        ))
+    
+    def _engine_fingerprint(self, engine: str) -> str:
+        """Параметры движка, влияющие на результат (часть ключа кэша)"""
+        lid_model = os.path.basename(self.config.lid_model_path)
+        if engine == "paddleocr":
+            return f"paddleocr|{self.config.paddle_lang}|{self.config.paddle_use_angle_cls}|{self.config.min_confidence}|{lid_model}"
+        return f"tesseract|{self.config.tesseract_lang}|{self.config.tesseract_config}|{lid_model}"
+    
+    async def _run_engine_cached(
+        self,
+        engine: str,
+        run_engine: Callable[[bytes], Awaitable[Optional[OCRResult]]],
+        image_bytes: bytes,
+        image_hash: Optional[str]
+    ) -> Optional[OCRResult]:
+        """Запуск движка через кэш результатов (ключ — md5 изображения и параметры движка)"""
+        if image_hash is None:
+            return await run_engine(image_bytes)
+        
+        key = hashlib.md5(f"{image_hash}|{self._engine_fingerprint(engine)}".encode()).hexdigest()
+        
+        cached = self._results_cache.get(key)
+        if cached is not None:
+            self._results_cache.move_to_end(key)
+            return cached
+        
+        cache_path = self._results_cache_dir / f"{key}.json"
+        result = await asyncio.to_thread(_load_cached_result, cache_path)
+        if result is None:
+            result = await run_engine(image_bytes)
+            if result is None:
+                return None  # Пустой результат или ошибка движка не кэшируются
+            await asyncio.to_thread(_store_cached_result, cache_path, result)
+        
+        self._results_cache[key] = result
+        if len(self._results_cache) > self.config.memory_cache_size:
+            self._results_cache.popitem(last=False)
+        return result
+    
+    def _get_paddle_pipeline(self) -> "PaddleOCRPipeline":
+        """Конвейер PaddleOCR текущего event loop (создается при первом запросе)"""
+        loop = asyncio.get_running_loop()
+        pipeline = self._paddle_pipeline
+        if pipeline is None or pipeline.loop is not loop:
+            pipeline = PaddleOCRPipeline(
+                lambda: self.paddle_ocr,
+                self.config.paddle_batch_size,
+                self.config.paddle_queue_size
+            )
+            self._paddle_pipeline = pipeline
+        return pipeline
+    
+    def close(self):
+        """Остановка воркера и пула процессов PaddleOCR"""
+        if self._paddle_pipeline is not None:
+            self._paddle_pipeline.close()
+            self._paddle_pipeline = None
+        if self._paddle_pool is not None:
+            self._paddle_pool.shutdown(wait=False, cancel_futures=True)
+            self._paddle_pool = None
+    
+    async def _run_paddle_ocr(self, image_bytes: bytes) -> Optional[OCRResult]:
+        """
+        Запуск PaddleOCR: через конвейер (декодирование -> пакетный инференс) или,
+        на CPU, в пуле процессов; постобработка — в потоке
+        """
+        try:
+            start_time = time.perf_counter()
+            if self._paddle_pool is not None:
+                async with _OCR_SEMAPHORE:
+                    results = await asyncio.get_running_loop().run_in_executor(
+                        self._paddle_pool, _paddle_process_ocr, image_bytes,
+                        self.config.paddle_use_angle_cls, self.config.paddle_lang
+                    )
+            else:
+                results = await self._get_paddle_pipeline().submit(image_bytes)
+            # Постобработка (включая определение языка) — в потоке
+            return await asyncio.to_thread(self._parse_paddle_results, results, start_time)
+        except Exception as e:
+            self.logger.warning(f"PaddleOCR failed: {e}")
+            return None
+    
+    def _detect_language(self, text: str) -> str:
+        """Язык текста по fasttext lid.176 (C++; модель не требует seed и потокобезопасна)"""
+        try:
+            model = _get_lid_model(self.config.lid_model_path)
+            # predict работает с одной строкой: переводы строк недопустимы
+            labels, _ = model.predict(text.replace("\n", " ")[:LID_MAX_CHARS], k=1)
+            return labels[0].replace("__label__", "") if labels else "unknown"
+        except Exception:
+            return "unknown"
+    
+    def _parse_paddle_results(self, results: Any, start_time: float) -> Optional[OCRResult]:
+        """Извлечение текста и confidence из результата PaddleOCR"""
+        try:
             if not results or not results[0]:
                 return None
             
-            # Извлекаем текст и confidence
+            # Извлекаем текст и confidence (массивы выделяются сразу на все строки)
+            lines = results[0]
+            bboxes = np.empty((len(lines), 4, 2), dtype=np.float32)
+            confidences = np.empty(len(lines), dtype=np.float32)
             text_parts = []
-            confidences = []
-            bbox_info = []
             
-            for line in results[0]:
+            for line in lines:
                 if len(line) >= 2:
                     bbox, (text, confidence) = line[0], line[1]
                     if confidence >= self.config.min_confidence:
+                        bboxes[len(text_parts)] = bbox
+                        confidences[len(text_parts)] = confidence
                         text_parts.append(text)
-                        confidences.append(confidence)
-                        bbox_info.append({
-                            'bbox': bbox,
-                            'text': text,
-                            'confidence': confidence
-                        })
             
             if not text_parts:
                 return None
             
+            bboxes = bboxes[:len(text_parts)]
+            confidences = confidences[:len(text_parts)]
             full_text = ' '.join(text_parts)
-            avg_confidence = statistics.mean(confidences)
+            avg_confidence = float(confidences.mean(dtype=np.float64))
             
             # Определяем язык
-            try:
-                language = detect(full_text)
-            except:
-                language = "unknown"
+            language = self._detect_language(full_text)
             
-            processing_time = (datetime.now() - start_time).total_seconds()
+            processing_time = time.perf_counter() - start_time
             
             return OCRResult(
                 engine="paddleocr",
@@ -291,53 +645,63 @@ class OCRValidator:
                 processing_time=processing_time,
                 word_count=len(full_text.split()),
                 language=language,
-                bbox_info=bbox_info
+                bboxes=bboxes,
+                confidences=confidences,
+                texts=text_parts
             )
             
         except Exception as e:
             self.logger.warning(f"PaddleOCR failed: {e}")
             return None
     
-    async def _run_tesseract_ocr(self, image_path: str) -> Optional[OCRResult]:
-        """Запуск Tesseract OCR"""
+    async def _run_tesseract_ocr(self, image_bytes: bytes) -> Optional[OCRResult]:
+        """
+        Запуск Tesseract асинхронным подпроцессом: один вызов выдает и текст (txt),
+        и TSV с confidence слов — модель загружается один раз на страницу.
+        Изображение передается через stdin (файл повторно не читается)
+        """
         try:
-            start_time = datetime.now()
-            
-            # Загружаем изображение
-            image = Image.open(image_path)
-            
-            # Запускаем OCR
-            text = pytesseract.image_to_string(
-                image, 
-                lang=self.config.tesseract_lang,
-                config=self.config.tesseract_config
-            )
+            start_time = time.perf_counter()
+            
+            async with _OCR_SEMAPHORE:
+                with tempfile.TemporaryDirectory(dir=self.config.temp_dir) as output_dir:
+                    output_base = os.path.join(output_dir, "ocr")
+                    process = await asyncio.create_subprocess_exec(
+                        self.config.tesseract_cmd, "stdin", output_base,
+                        "-l", self.config.tesseract_lang,
+                        *shlex.split(self.config.tesseract_config),
+                        "txt", "tsv",
+                        stdin=asyncio.subprocess.PIPE,
+                        stdout=asyncio.subprocess.DEVNULL,
+                        stderr=asyncio.subprocess.PIPE
+                    )
+                    _, stderr = await process.communicate(image_bytes)
+                    if process.returncode != 0:
+                        raise RuntimeError(stderr.decode(errors="replace").strip())
+                    
+                    text = Path(f"{output_base}.txt").read_text(encoding="utf-8")
+                    tsv = Path(f"{output_base}.tsv").read_text(encoding="utf-8")
             
             if not text.strip():
                 return None
             
-            # Получаем данные о confidence (если доступно)
+            # Confidence слов из TSV (колонка conf; -1 у строк без текста):
+            # только эта колонка, одним проходом C-парсера numpy
             try:
-                data = pytesseract.image_to_data(
-                    image, 
-                    lang=self.config.tesseract_lang,
-                    config=self.config.tesseract_config,
-                    output_type=pytesseract.Output.DICT
+                confidences = np.loadtxt(
+                    io.StringIO(tsv), delimiter="\t", usecols=TSV_CONF_COLUMN,
+                    skiprows=1, comments=None, dtype=np.float32, ndmin=1
                 )
-                
-                confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
-                avg_confidence = statistics.mean(confidences) / 100.0 if confidences else 0.5
+                positive = confidences[confidences > 0]
+                avg_confidence = float(positive.mean(dtype=np.float64)) / 100.0 if positive.size else 0.5
                 
             except:
                 avg_confidence = 0.5  # Дефолтное значение
             
             # Определяем язык
-            try:
-                language = detect(text)
-            except:
-                language = "unknown"
+            language = self._detect_language(text)
             
-            processing_time = (datetime.now() - start_time).total_seconds()
+            processing_time = time.perf_counter() - start_time
             
             return OCRResult(
                 engine="tesseract",
@@ -379,16 +743,13 @@ class OCRValidator:
             )
         
         # Анализируем сходство между результатами
-        similarity_scores = []
         texts = [result.text for result in ocr_results]
         
-        # Попарное сравнение всех текстов
-        for i in range(len(texts)):
-            for j in range(i + 1, len(texts)):
-                similarity = self._calculate_text_similarity(texts[i], texts[j])
-                similarity_scores.append(similarity)
+        # Попарное сравнение всех текстов: верхний треугольник матрицы сходства
+        has_chinese = np.array([result.has_cjk for result in ocr_results])
+        similarity_scores = self._similarity_matrix(texts, has_chinese)[np.triu_indices(len(texts), k=1)]
         
-        avg_similarity = statistics.mean(similarity_scores)
+        avg_similarity = float(similarity_scores.mean())
         
         # Выбираем лучший результат как консенсус
         best_result = max(ocr_results, key=lambda r: r.confidence)
@@ -403,7 +764,7 @@ class OCRValidator:
         
         # Проверяем язык
         detected_languages = [r.language for r in ocr_results if r.language != "unknown"]
-        if detected_languages and all(lang != expected_language[:2] for lang in detected_languages):
+        if detected_languages and expected_language[:2] not in set(detected_languages):
             issues_found.append(f"Language mismatch: expected {expected_language}, got {detected_languages}")
             consensus_confidence *= 0.9
         
@@ -426,7 +787,7 @@ class OCRValidator:
             recommendations=recommendations,
             processing_time=0.0,
             metadata={
-                "similarity_scores": similarity_scores,
+                "similarity_scores": similarity_scores.tolist(),
                 "avg_similarity": avg_similarity,
                 "best_engine": best_result.engine,
                 "detected_languages": detected_languages
@@ -435,39 +796,54 @@ class OCRValidator:
     
     def _calculate_text_similarity(self, text1: str, text2: str) -> float:
         """Расчет сходства между двумя текстами"""
+        return float(self._similarity_matrix([text1, text2])[0, 1])
+    
+    def _similarity_matrix(self, texts: List[str], has_chinese: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Матрица попарного сходства текстов: Levenshtein и Indel считаются rapidfuzz
+        cdist целиком, токенизация (слова, jieba) выполняется один раз на текст,
+        а не для каждой пары
+        """
+        n = len(texts)
         try:
-            if not text1.strip() or not text2.strip():
-                return 0.0
-            
-            # Используем несколько метрик
-            
             # 1. Levenshtein distance (normalized)
-            levenshtein_sim = 1.0 - (levenshtein.distance(text1, text2) / max(len(text1), len(text2)))
+            levenshtein_sim = process.cdist(texts, texts, scorer=Levenshtein.normalized_similarity, dtype=np.float64, workers=-1)
             
             # 2. Jaccard similarity для слов
-            words1 = set(text1.split())
-            words2 = set(text2.split())
-            jaccard_sim = jaccard.similarity(words1, words2)
-            
-            # 3. SequenceMatcher для более точного сравнения
-            sequence_sim = difflib.SequenceMatcher(None, text1, text2).ratio()
-            
-            # Для китайского текста используем jieba
-            if self.config.chinese_mode and any('\u4e00' <= char <= '\u9fff' for char in text1 + text2):
-                # Токенизация китайского текста
-                tokens1 = set(jieba.cut(text1))
-                tokens2 = set(jieba.cut(text2))
-                chinese_sim = len(tokens1 & tokens2) / len(tokens1 | tokens2) if tokens1 | tokens2 else 0.0
+            word_sets = [set(text.split()) for text in texts]
+            jaccard_sim = _set_similarity_matrix(word_sets)
+            
+            # 3. Доля общих символов (как SequenceMatcher.ratio, но без эвристик junk)
+            sequence_sim = process.cdist(texts, texts, scorer=Indel.normalized_similarity, dtype=np.float64, workers=-1)
+            
+            # Средневзвешенное для обычного текста
+            similarity = levenshtein_sim * 0.4 + jaccard_sim * 0.3 + sequence_sim * 0.3
+            
+            # Для китайского текста используем jieba (пара, в которой хотя бы один текст с иероглифами)
+            if has_chinese is None:
+                has_chinese = np.array([_has_cjk(text) for text in texts])
+            if self.config.chinese_mode and has_chinese.any():
+                import jieba
+                token_sets = [set(jieba.cut(text)) for text in texts]
+                chinese_sim = _set_similarity_matrix(token_sets)
                 
                 # Средневзвешенное с учетом китайской токенизации
-                return (levenshtein_sim * 0.3 + jaccard_sim * 0.2 + sequence_sim * 0.3 + chinese_sim * 0.2)
-            else:
-                # Средневзвешенное для обычного текста
-                return (levenshtein_sim * 0.4 + jaccard_sim * 0.3 + sequence_sim * 0.3)
-                
+                chinese_pairs = has_chinese[:, None] | has_chinese[None, :]
+                similarity = np.where(
+                    chinese_pairs,
+                    levenshtein_sim * 0.3 + jaccard_sim * 0.2 + sequence_sim * 0.3 + chinese_sim * 0.2,
+                    similarity
+                )
+            
+            # Пустой текст не похож ни на что
+            empty = np.array([not text.strip() for text in texts])
+            similarity[empty, :] = 0.0
+            similarity[:, empty] = 0.0
+            return similarity
+            
         except Exception as e:
             self.logger.warning(f"Error calculating text similarity: {e}")
-            return 0.0
+            return np.zeros((n, n))
 
 # =======================================================================================
 # ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ
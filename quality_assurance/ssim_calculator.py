@@ -8,12 +8,93 @@ SSIM Calculator для PDF Converter Pipeline v4.0
 
 import cv2
 import numpy as np
-from skimage.metrics import structural_similarity as ssim
 from typing import Tuple, Optional
 import structlog
 
 logger = structlog.get_logger("ssim_calculator")
 
+# Константы SSIM (как в skimage.metrics.structural_similarity)
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+SSIM_TILE_SIZE = 512
+
+
+def _ssim_map_sum(gray1: np.ndarray, gray2: np.ndarray, win_size: int, data_range: float) -> float:
+    """Сумма карты SSIM по блоку (без краев шириной в пол-окна)"""
+    x = gray1.astype(np.float32)
+    y = gray2.astype(np.float32)
+    
+    def box(image: np.ndarray) -> np.ndarray:
+        return cv2.boxFilter(image, -1, (win_size, win_size), borderType=cv2.BORDER_REFLECT)
+    
+    # Выборочная ковариация, как use_sample_covariance=True в skimage
+    cov_norm = win_size * win_size / (win_size * win_size - 1)
+    ux, uy = box(x), box(y)
+    vx = cov_norm * (box(x * x) - ux * ux)
+    vy = cov_norm * (box(y * y) - uy * uy)
+    vxy = cov_norm * (box(x * y) - ux * uy)
+    
+    c1 = (SSIM_K1 * data_range) ** 2
+    c2 = (SSIM_K2 * data_range) ** 2
+    ssim_map = ((2 * ux * uy + c1) * (2 * vxy + c2)) / ((ux * ux + uy * uy + c1) * (vx + vy + c2))
+    
+    pad = (win_size - 1) // 2
+    return float(ssim_map[pad:-pad, pad:-pad].sum(dtype=np.float64))
+
+
+def compute_ssim(
+    gray1: np.ndarray,
+    gray2: np.ndarray,
+    win_size: int = 7,
+    tile_size: int = SSIM_TILE_SIZE
+) -> float:
+    """
+    Средний SSIM двух grayscale изображений одного размера
+    
+    Та же формула, что skimage structural_similarity (равномерное окно), но локальные
+    средние считаются SIMD-фильтром cv2.boxFilter во float32, а большие страницы
+    обрабатываются блоками tile_size x tile_size (с перекрытием в пол-окна),
+    чтобы промежуточные массивы помещались в кэш
+    
+    Args:
+        gray1: Первое изображение (grayscale)
+        gray2: Второе изображение (grayscale, того же размера)
+        win_size: Размер окна для SSIM (нечетный)
+        tile_size: Размер блока
+        
+    Returns:
+        float: SSIM score
+    """
+    if gray1.shape != gray2.shape:
+        raise ValueError("Input images must have the same dimensions")
+    if win_size < 3 or win_size % 2 == 0:
+        raise ValueError("win_size must be odd and >= 3")
+    
+    height, width = gray1.shape[:2]
+    pad = (win_size - 1) // 2
+    if height < win_size or width < win_size:
+        raise ValueError("win_size exceeds image dimensions")
+    
+    # Диапазон данных как в skimage: по dtype для целых, 1.0 для float
+    if np.issubdtype(gray1.dtype, np.integer):
+        data_range = float(np.iinfo(gray1.dtype).max) - float(np.iinfo(gray1.dtype).min)
+    else:
+        data_range = 1.0
+    
+    total = 0.0
+    for top in range(pad, height - pad, tile_size):
+        bottom = min(top + tile_size, height - pad)
+        for left in range(pad, width - pad, tile_size):
+            right = min(left + tile_size, width - pad)
+            total += _ssim_map_sum(
+                gray1[top - pad:bottom + pad, left - pad:right + pad],
+                gray2[top - pad:bottom + pad, left - pad:right + pad],
+                win_size,
+                data_range
+            )
+    
+    return total / ((height - 2 * pad) * (width - 2 * pad))
+
 
 def calculate_ssim(
     img_path1: str, 
@@ -34,9 +115,9 @@ def calculate_ssim(
         float: SSIM score [0..1]
     """
     try:
-        # Загружаем изображения
-        img1 = cv2.imread(img_path1)
-        img2 = cv2.imread(img_path2)
+        # Загружаем изображения сразу в grayscale (без 3-канального буфера и cvtColor)
+        img1 = cv2.imread(img_path1, cv2.IMREAD_GRAYSCALE)
+        img2 = cv2.imread(img_path2, cv2.IMREAD_GRAYSCALE)
         
         if img1 is None or img2 is None:
             logger.error(f"Cannot load images: {img_path1}, {img_path2}")
@@ -54,12 +135,8 @@ def calculate_ssim(
             img1 = cv2.resize(img1, (width, height))
             img2 = cv2.resize(img2, (width, height))
         
-        # Конвертируем в grayscale
-        gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
-        gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-        
         # Вычисляем SSIM
-        ssim_score = ssim(gray1, gray2, win_size=win_size)
+        ssim_score = compute_ssim(img1, img2, win_size=win_size)
         
         return float(ssim_score)
         
@@ -76,6 +153,9 @@ def calculate_ssim_arrays(
     """
     Вычисление SSIM между двумя массивами изображений
     
+    Цветные изображения конвертируются в grayscale; вызывающим лучше сразу
+    передавать grayscale (cv2.IMREAD_GRAYSCALE при загрузке)
+    
     Args:
         img1: Первое изображение как numpy array
         img2: Второе изображение как numpy array
@@ -99,7 +179,7 @@ def calculate_ssim_arrays(
             img2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
         
         # Вычисляем SSIM
-        ssim_score = ssim(img1, img2, win_size=win_size)
+        ssim_score = compute_ssim(img1, img2, win_size=win_size)
         
         return float(ssim_score)
         
@@ -15,13 +15,13 @@ from pathlib import Path
 import tempfile
 import json
 from dataclasses import dataclass
-from datetime import datetime
+import time
+from statistics import fmean
 
 # Обработка изображений и визуальное сравнение
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
-from skimage import metrics
 from skimage.color import rgb2gray
 from skimage.transform import resize
 
@@ -35,6 +35,9 @@ import matplotlib.patches as patches
 import structlog
 from prometheus_client import Counter, Histogram, Gauge
 
+# SSIM на cv2.boxFilter (блоками)
+from ssim_calculator import compute_ssim
+
 # =======================================================================================
 # КОНФИГУРАЦИЯ И МЕТРИКИ
 # =======================================================================================
@@ -133,7 +136,7 @@ class VisualDiffSystem:
         Returns:
             VisualDiffResult: Результат сравнения
         """
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         
         try:
             visual_diff_requests.labels(status='started').inc()
@@ -180,11 +183,11 @@ class VisualDiffSystem:
                 ))
             
             # Расчет общих метрик
-            overall_ssim = np.mean(ssim_scores_list) if ssim_scores_list else 0.0
+            overall_ssim = fmean(ssim_scores_list) if ssim_scores_list else 0.0
             overall_similarity = self._calculate_overall_similarity(differences, overall_ssim)
             
             # Обновляем метрики
-            processing_time = (datetime.now() - start_time).total_seconds()
+            processing_time = time.perf_counter() - start_time
             visual_diff_duration.observe(processing_time)
             ssim_scores.observe(overall_ssim)
             
@@ -293,11 +296,7 @@ class VisualDiffSystem:
             gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
             
             # Рассчитываем SSIM
-            ssim_score = metrics.structural_similarity(
-                gray1, gray2,
-                win_size=self.config.ssim_window_size,
-                full=True
-            )[0]
+            ssim_score = compute_ssim(gray1, gray2, win_size=self.config.ssim_window_size)
             
             # Находим различия
             differences = await self._find_visual_differences(
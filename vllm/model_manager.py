@@ -37,6 +37,11 @@ class ModelConfig:
     tensor_parallel_size: int = 2
     max_model_len: int = 8192
     gpu_memory_utilization: float = 0.9
+    # По умолчанию KV cache в dtype модели; fp8 (вдвое меньше памяти KV, возможна
+    # потеря точности) включается явно через VLLM_KV_CACHE_DTYPE
+    kv_cache_dtype: str = "auto"
+    # "awq"/"gptq" — только для соответствующих квантизованных чекпоинтов
+    quantization: Optional[str] = None
 
 class DynamicModelManager:
     def __init__(self):
@@ -51,6 +56,8 @@ class DynamicModelManager:
         
     def _register_models(self):
         """Регистрация моделей с правильными именами"""
+        kv_cache_dtype = os.getenv("VLLM_KV_CACHE_DTYPE", "auto")
+        quantization = os.getenv("VLLM_QUANTIZATION") or None
         
         # Content Transformation - VL модель для документов  
         content_model = ModelConfig(
@@ -60,7 +67,9 @@ class DynamicModelManager:
             estimated_vram_gb=32.0,
             tensor_parallel_size=2,
             max_model_len=8192,
-            gpu_memory_utilization=0.9
+            gpu_memory_utilization=0.9,
+            kv_cache_dtype=kv_cache_dtype,
+            quantization=quantization
         )
         
         # Translation - обычная текстовая модель
@@ -71,7 +80,9 @@ class DynamicModelManager:
             estimated_vram_gb=30.0,
             tensor_parallel_size=2,
             max_model_len=8192,
-            gpu_memory_utilization=0.9
+            gpu_memory_utilization=0.9,
+            kv_cache_dtype=kv_cache_dtype,
+            quantization=quantization
         )
         
         self.models = {
@@ -181,7 +192,10 @@ class DynamicModelManager:
                     tensor_parallel_size=model_config.tensor_parallel_size,
                     gpu_memory_utilization=model_config.gpu_memory_utilization,
                     max_model_len=model_config.max_model_len,
-                    dtype="bfloat16",
+                    # AWQ ядра vLLM работают только с float16
+                    dtype="float16" if model_config.quantization == "awq" else "bfloat16",
+                    kv_cache_dtype=model_config.kv_cache_dtype,
+                    quantization=model_config.quantization,
                     trust_remote_code=True,
                     enable_prefix_caching=True,
                     disable_log_stats=False,